@@ -0,0 +1,91 @@
+"""
+Benchmark of the compression codecs available for the Blinky files
+
+The compression ratio and the encoding/decoding speed are measured on
+synthetic Blinky signals. The signal power of a few random sources is mapped
+to the LED intensity on a decibel scale and then spread on small boxes of
+pixels with some camera noise.
+
+    python benchmarks/bench_codecs.py --n_frames 18000 --n_blinkies 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from blinkytools.io import CODECS, BlinkyFile
+from blinkytools.non_linearity import blinky_max_db, blinky_min_db, decibels
+
+
+def synthetic_blinky_data(n_frames, n_blinkies, box_size=3, n_colors=3, seed=0):
+    """ Generates synthetic pixel boxes of Blinky signals """
+    rng = np.random.RandomState(seed)
+
+    # power of a few sources switching on and off, mixed at the blinkies
+    n_sources = 3
+    activity = rng.rand(n_frames // 30 + 1, n_sources) > 0.5
+    activity = np.repeat(activity, 30, axis=0)[:n_frames]
+    power = activity * 10 ** rng.uniform(-6, -2, size=(n_frames, n_sources))
+    mixing = rng.uniform(0.1, 1.0, size=(n_sources, n_blinkies))
+    signals = (decibels(power @ mixing + 1e-8) - blinky_min_db) / (
+        blinky_max_db - blinky_min_db
+    )
+    signals = np.clip(signals, 0.0, 1.0)
+
+    # spread on the boxes with a fixed spatial profile and camera noise
+    profile = rng.uniform(0.5, 1.0, size=(box_size, box_size, n_colors))
+    data = signals[:, :, None, None, None] * profile * 255
+    data += rng.randn(*data.shape) * 2.0
+
+    return np.clip(data, 0, 255).astype(np.uint8)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the compression codecs of the Blinky files"
+    )
+    parser.add_argument("--n_frames", type=int, default=9000, help="Number of frames")
+    parser.add_argument(
+        "--n_blinkies", type=int, default=100, help="Number of Blinky signals"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Number of repetitions")
+    args = parser.parse_args()
+
+    data = synthetic_blinky_data(args.n_frames, args.n_blinkies)
+    locations = [(i, i) for i in range(args.n_blinkies)]
+    bfile = BlinkyFile(locations, data, 30.0)
+
+    size_mb = data.nbytes / 1e6
+    print(f"Data: shape {data.shape} dtype {data.dtype} size {size_mb:.1f} MB")
+    print(
+        "{:>12s} {:>8s} {:>14s} {:>14s}".format(
+            "codec", "ratio", "encode [MB/s]", "decode [MB/s]"
+        )
+    )
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "bench.blinky")
+
+        for codec in [None] + CODECS:
+
+            t_enc, t_dec = [], []
+            for r in range(args.repeat):
+                t = time.perf_counter()
+                bfile.dump(filename, chunk_size=1024, codec=codec)
+                t_enc.append(time.perf_counter() - t)
+
+                t = time.perf_counter()
+                loaded = BlinkyFile.load(filename)
+                t_dec.append(time.perf_counter() - t)
+
+            assert np.array_equal(loaded.data, data)
+
+            ratio = data.nbytes / os.path.getsize(filename)
+            print(
+                "{:>12s} {:8.2f} {:14.1f} {:14.1f}".format(
+                    str(codec), ratio, size_mb / min(t_enc), size_mb / min(t_dec)
+                )
+            )
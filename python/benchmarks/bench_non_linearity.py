@@ -0,0 +1,113 @@
+"""
+Benchmark of the inverse of the Blinky non-linearity
+
+The vectorized `lut_interp_inv` is compared to the reference implementation
+that loops over the samples, and the dense tables to `blinky_non_linearity`
+and `blinky_non_linearity_inv`.
+
+    python benchmarks/bench_non_linearity.py --n_samples 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from blinkytools.non_linearity import (
+    blinky_lut,
+    blinky_non_linearity,
+    blinky_non_linearity_dense,
+    blinky_non_linearity_inv,
+    blinky_non_linearity_inv_dense,
+    clip,
+    lut_interp_inv,
+)
+
+
+def lut_interp_inv_loop(y, lut):
+    """ Reference implementation, one sample at a time """
+
+    y = clip(y, lo=0.0, hi=lut[-1])
+
+    x = np.linspace(0, lut[-1], len(lut))
+
+    y2 = y.flatten()
+    output = np.zeros(y2.shape)
+
+    for i in range(y2.shape[0]):
+        k = np.where(y2[i] - lut[:-1] >= 0)[0][-1]
+
+        a = (lut[k + 1] - lut[k]) / (x[k + 1] - x[k])
+        b = lut[k]
+
+        output[i] = (y2[i] - b) / a + x[k]
+
+    return output.reshape(y.shape)
+
+
+def timeit(func, *args, repeat=3):
+    runtimes = []
+    for r in range(repeat):
+        t = time.perf_counter()
+        out = func(*args)
+        runtimes.append(time.perf_counter() - t)
+    return min(runtimes), out
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the inverse of the Blinky non-linearity"
+    )
+    parser.add_argument(
+        "--n_samples", type=int, default=100000, help="Number of samples"
+    )
+    parser.add_argument(
+        "--n_samples_loop",
+        type=int,
+        default=10000,
+        help="Number of samples for the (slow) reference implementation",
+    )
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(0)
+    y = rng.uniform(-0.1, 1.1, size=args.n_samples)
+
+    # check that both implementations agree
+    n = min(args.n_samples, args.n_samples_loop)
+    t_loop, ref = timeit(lut_interp_inv_loop, y[:n], blinky_lut, repeat=1)
+    _, out = timeit(lut_interp_inv, y[:n], blinky_lut)
+    assert np.array_equal(ref, out), "The outputs differ"
+
+    t_vec, _ = timeit(lut_interp_inv, y, blinky_lut)
+
+    rate_loop = n / t_loop
+    rate_vec = args.n_samples / t_vec
+    print(f"loop:       {rate_loop / 1e6:10.3f} Msamples/s")
+    print(f"vectorized: {rate_vec / 1e6:10.3f} Msamples/s")
+    print(f"speed-up:   {rate_vec / rate_loop:10.1f}x")
+
+    # dense table for pixel values
+    pixels = rng.randint(0, 256, size=args.n_samples).astype(np.uint8)
+    out = np.empty(pixels.shape)
+    t_ref, ref = timeit(blinky_non_linearity_inv, pixels / 255)
+    t_dense, _ = timeit(blinky_non_linearity_inv_dense, pixels, 255, out)
+    assert np.allclose(ref, out, rtol=1e-12, atol=0), "The outputs differ"
+
+    rate_ref = args.n_samples / t_ref
+    rate_dense = args.n_samples / t_dense
+    print(f"inverse (uint8): {rate_ref / 1e6:10.3f} Msamples/s")
+    print(f"dense table:     {rate_dense / 1e6:10.3f} Msamples/s")
+    print(f"speed-up:        {rate_dense / rate_ref:10.1f}x")
+
+    # dense table for the forward mapping
+    power = 10 ** rng.uniform(-10, 0, size=args.n_samples)
+    out = np.empty(power.shape)
+    t_ref, ref = timeit(blinky_non_linearity, power)
+    t_dense, _ = timeit(blinky_non_linearity_dense, power, out)
+    assert np.allclose(ref, out, rtol=0, atol=3e-4), "The outputs differ"
+
+    rate_ref = args.n_samples / t_ref
+    rate_dense = args.n_samples / t_dense
+    print(f"forward:         {rate_ref / 1e6:10.3f} Msamples/s")
+    print(f"dense table:     {rate_dense / 1e6:10.3f} Msamples/s")
+    print(f"speed-up:        {rate_dense / rate_ref:10.1f}x")
@@ -20,5 +20,5 @@
 import tkinter
 
 from .gui import BlinkyViewer, start_viewer
-from .io import BlinkyFile
+from .io import BlinkyDataset, BlinkyFile, BlinkyFileWriter
 from .non_linearity import blinky_non_linearity, blinky_non_linearity_inv, clip
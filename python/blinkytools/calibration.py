@@ -0,0 +1,462 @@
+# Copyright 2020 Robin Scheibler
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+This file contains routines to calibrate the non-linearity of individual
+Blinkies from recordings of the calibration ramps of the firmware
+
+In the `CALIBRATION_RAMP_MAP` mode, the duty cycle of the LED sweeps the
+unit interval through the non-linearity, in periods of `CALIB_PERIOD_SEC`
+seconds. The normalized pixel values measured along the ramp are then
+directly the look-up table of the device, including the response of the
+camera. In the `CALIBRATION_RAMP` mode, the duty cycle sweeps the unit
+interval linearly, which measures the response of the camera only, and the
+look-up table is obtained by composition with `blinky_lut`.
+
+The firmware alternates the color of the LED (white, red) at every period,
+and only the periods of one color (white by default) are used for the fit.
+The color of the periods is not recorded, the white periods are the ones
+with the larger range of the signal. The periods to use for the fit can be
+further selected with the `periods` argument.
+
+    calib = calibrate("ramp.blinky", cache="calibration.msgpack")
+    y = calib.apply(signals, locations)
+"""
+import os
+
+import msgpack
+import numpy as np
+from datetime import datetime
+
+from .io import BlinkyFile, _pack, decoder, reduce_boxes
+from .non_linearity import blinky_lut, blinky_non_linearity_inv
+from .utils import pixel_to_str
+from .version import __version__
+
+# Length of one period of the ramp in the firmware (config.h)
+CALIB_PERIOD_SEC = 3.0
+
+# The colors of the LED alternated by the firmware during the ramps
+RAMP_COLORS = ["white", "red"]
+
+# The fitted look-up tables are made strictly increasing by this amount
+# so that they can be inverted
+_EPS = 1e-6
+
+
+def ramp_phase(signals, period=None, threshold=0.5, min_drop=0.1):
+    """
+    Find the position of every frame in the ramp, for all the signals at once
+
+    The starts of the ramps are detected as large drops of the signals. The
+    drops are measured relative to the height of the signal before them, as
+    the ramps of the two colors of the LED do not reach the same values.
+
+    Parameters
+    ----------
+    signals: numpy.ndarray (n_frames, n_pixels)
+        The Blinky signals
+    period: float, optional
+        The length of the ramp in frames, if not provided, it is estimated
+        from the spacing of the drops
+    threshold: float, optional
+        The minimum size of a drop, relative to the height of the signal
+        above its minimum before the drop
+    min_drop: float, optional
+        The minimum size of a drop, relative to the range of the signal
+
+    Returns
+    -------
+    phase: numpy.ndarray (n_frames, n_pixels)
+        The position of the frames in the ramp, in [0, 1)
+    index: numpy.ndarray (n_frames, n_pixels)
+        The index of the period of the ramp of the frames, 0 for the first
+        complete ramp, and -1 for the frames before it
+    valid: numpy.ndarray (n_frames, n_pixels)
+        False for the frames that are too close to the start of a ramp to be
+        used, or for signals where no ramp was found
+    period: float
+        The length of the ramp in frames
+    """
+    signals = np.asarray(signals)
+    n_frames, n_pixels = signals.shape
+
+    bottom = np.min(signals, axis=0)
+    amplitude = np.max(signals, axis=0) - bottom
+    diff = np.diff(signals, axis=0)
+    drops = (diff < -threshold * (signals[:-1] - bottom)) & (diff < -min_drop * amplitude)
+    pix, frm = np.nonzero(drops.T)
+    frm = frm + 1
+
+    if period is None:
+        spacing = np.diff(frm)[pix[1:] == pix[:-1]]
+        # a drop spread over two frames counts once
+        spacing = spacing[spacing > 1]
+        if len(spacing) == 0:
+            raise ValueError("Could not find two consecutive ramps in the signals")
+        period = float(np.median(spacing))
+
+    # the start of the first ramp is the circular mean of the drop positions,
+    # the drop happens between the frame before and the first frame of a ramp
+    angle = 2 * np.pi * (frm - 0.5) / period
+    re = np.bincount(pix, weights=np.cos(angle), minlength=n_pixels)
+    im = np.bincount(pix, weights=np.sin(angle), minlength=n_pixels)
+    start = np.mod(np.arctan2(im, re) / (2 * np.pi), 1.0) * period
+
+    cycles = (np.arange(n_frames)[:, None] - start[None, :]) / period
+    index = np.floor(cycles)
+    phase = cycles - index
+
+    # the frames around the start of a ramp may mix two levels
+    valid = (phase * period >= 0.5) & ((1.0 - phase) * period >= 1.0)
+    valid &= (np.bincount(pix, minlength=n_pixels) > 0)[None, :]
+
+    return phase, index.astype(np.int64), valid, period
+
+
+def _fill_gaps(curves):
+    """ Replace the NaN in the curves by the previous, or next, valid value """
+    n_curves, n_points = curves.shape
+    missing = np.isnan(curves)
+
+    pos = np.where(missing, 0, np.arange(n_points)[None, :])
+    pos = np.maximum.accumulate(pos, axis=1)
+    filled = np.take_along_axis(curves, pos, axis=1)
+
+    missing = np.isnan(filled)
+    pos = np.where(missing, n_points - 1, np.arange(n_points)[None, :])
+    pos = np.minimum.accumulate(pos[:, ::-1], axis=1)[:, ::-1]
+
+    return np.take_along_axis(filled, pos, axis=1)
+
+
+def _ramp_curves(signals, phase, valid, n_points):
+    """ The monotone average of the signals along the ramp, for every signal """
+    n_frames, n_pixels = signals.shape
+
+    # average the values in bins of the ramp, for all the signals at once
+    bins = np.rint(phase * (n_points - 1)).astype(np.int64)
+    bins += n_points * np.arange(n_pixels)[None, :]
+    size = n_points * n_pixels
+    sums = np.bincount(bins[valid], weights=signals[valid], minlength=size)
+    counts = np.bincount(bins[valid], minlength=size)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        curves = (sums / counts).reshape(n_pixels, n_points)
+    sampled = ~np.isnan(curves)
+    curves = _fill_gaps(curves)
+
+    # the frames around the drops are discarded and the ends of the ramp are
+    # not sampled, extend the curves linearly there
+    rows = np.arange(n_pixels)
+    x = np.arange(n_points)[None, :]
+    first = np.argmax(sampled, axis=1)
+    last = n_points - 1 - np.argmax(sampled[:, ::-1], axis=1)
+    slope_first = curves[rows, np.minimum(first + 1, n_points - 1)] - curves[rows, first]
+    slope_last = curves[rows, last] - curves[rows, np.maximum(last - 1, 0)]
+    curves = np.where(
+        x < first[:, None],
+        curves[rows, first][:, None] + (x - first[:, None]) * slope_first[:, None],
+        curves,
+    )
+    curves = np.where(
+        x > last[:, None],
+        curves[rows, last][:, None] + (x - last[:, None]) * slope_last[:, None],
+        curves,
+    )
+
+    # closest monotone curve, between the upper and lower envelopes
+    upper = np.maximum.accumulate(curves, axis=1)
+    lower = np.minimum.accumulate(curves[:, ::-1], axis=1)[:, ::-1]
+    return 0.5 * (upper + lower)
+
+
+def fit_ramp(
+    signals, period=None, mapped=True, n_points=None, periods=None, color="white"
+):
+    """
+    Fit the look-up tables of the non-linearity of all the signals at once
+
+    Parameters
+    ----------
+    signals: numpy.ndarray (n_frames, n_pixels)
+        The signals recorded during the calibration ramps
+    period: float, optional
+        The length of the ramp in frames, estimated if not provided
+    mapped: bool, optional
+        True if the ramp went through the non-linearity (`CALIBRATION_RAMP_MAP`),
+        False if the ramp was linear (`CALIBRATION_RAMP`)
+    n_points: int, optional
+        The number of points of the look-up tables (default to the length
+        of `blinky_lut`)
+    periods: list of int, optional
+        The index of the periods to use, counted from the first complete
+        ramp of every signal, and including the periods of both colors
+        (default to all)
+    color: str, optional
+        The color of the LED to fit, "white" or "red", or None to average
+        the periods of both colors
+
+    Returns
+    -------
+    luts: numpy.ndarray (n_pixels, n_points)
+        The look-up tables, increasing from 0 to 1, NaN if the fit failed
+    lo: numpy.ndarray (n_pixels,)
+        The pixel values at the bottom of the ramps
+    hi: numpy.ndarray (n_pixels,)
+        The pixel values at the top of the ramps
+    """
+    signals = np.asarray(signals, dtype=np.float64)
+    n_frames, n_pixels = signals.shape
+
+    if color is not None and color not in RAMP_COLORS:
+        raise ValueError(f"The color should be one of {RAMP_COLORS} or None")
+
+    if n_points is None:
+        n_points = len(blinky_lut)
+
+    phase, index, valid, period = ramp_phase(signals, period=period)
+
+    if periods is not None:
+        valid &= np.isin(index, periods)
+
+    if color is None:
+        curves = _ramp_curves(signals, phase, valid, n_points)
+    else:
+        # the color changes at every period, fit both and keep one
+        parity = np.mod(index, 2)
+        even = _ramp_curves(signals, phase, valid & (parity == 0), n_points)
+        odd = _ramp_curves(signals, phase, valid & (parity == 1), n_points)
+
+        # the white LED gives the larger range of the signal
+        range_even = even[:, -1] - even[:, 0]
+        range_odd = odd[:, -1] - odd[:, 0]
+        white_even = np.where(
+            np.isnan(range_odd) | np.isnan(range_even),
+            np.isnan(range_odd),
+            range_even >= range_odd,
+        )
+        use_even = white_even if color == "white" else ~white_even
+        curves = np.where(use_even[:, None], even, odd)
+
+    lo = curves[:, 0].copy()
+    hi = curves[:, -1].copy()
+    with np.errstate(invalid="ignore", divide="ignore"):
+        luts = (curves - lo[:, None]) / (hi - lo)[:, None]
+    luts[~(hi > lo)] = np.nan
+
+    if not mapped:
+        # the curves are the response of the camera to the duty cycle,
+        # evaluate them at the output of the non-linearity
+        p_f = blinky_lut * (n_points - 1)
+        p = np.minimum(np.floor(p_f).astype(np.int64), n_points - 2)
+        frac = p_f - p
+        luts = luts[:, p] + frac * (luts[:, p + 1] - luts[:, p])
+
+    ramp = np.linspace(0.0, _EPS, luts.shape[1])
+    luts = (luts + ramp) / (1.0 + _EPS)
+
+    return luts, lo, hi
+
+
+class Calibration(object):
+    """
+    A collection of per-device look-up tables, keyed by the location
+    of the devices in the image
+
+    Parameters
+    ----------
+    devices: dict, optional
+        The calibration of the devices, keyed by location, with entries
+        `lut`, `lo`, and `hi`
+    """
+
+    def __init__(self, devices=None, version=None, creation=None):
+        self.devices = {}
+        if devices is not None:
+            self.update(devices)
+
+        self.version = version if version is not None else __version__
+        self.creation = (
+            creation
+            if creation is not None
+            else datetime.now().astimezone().isoformat()
+        )
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, location):
+        return tuple(location) in self.devices
+
+    def __getitem__(self, location):
+        return self.devices[tuple(location)]
+
+    @property
+    def locations(self):
+        return list(self.devices.keys())
+
+    def update(self, other):
+        """ Add or replace the calibration of devices """
+        if isinstance(other, Calibration):
+            other = other.devices
+
+        for loc, entry in other.items():
+            self.devices[tuple(loc)] = {
+                "lut": np.asarray(entry["lut"], dtype=np.float64),
+                "lo": float(entry["lo"]),
+                "hi": float(entry["hi"]),
+            }
+
+    def lut(self, location):
+        """ The look-up table of the device at `location` """
+        return self[location]["lut"]
+
+    def normalize(self, signals, locations):
+        """
+        Map the pixel values of the signals to the unit interval using the
+        range measured during the calibration
+
+        Parameters
+        ----------
+        signals: numpy.ndarray (n_frames, n_pixels)
+            The Blinky signals
+        locations: list of tuples
+            The locations of the signals
+        """
+        for loc in locations:
+            if loc not in self:
+                raise KeyError(f"No calibration for the device at {pixel_to_str(loc)}")
+
+        lo = np.array([self[loc]["lo"] for loc in locations])
+        hi = np.array([self[loc]["hi"] for loc in locations])
+
+        return np.clip((np.asarray(signals) - lo) / (hi - lo), 0.0, 1.0)
+
+    def apply(self, signals, locations):
+        """
+        Inverse the non-linearity of the signals with the look-up table
+        of every device
+
+        Parameters
+        ----------
+        signals: numpy.ndarray (n_frames, n_pixels)
+            The Blinky signals
+        locations: list of tuples
+            The locations of the signals
+
+        Returns
+        -------
+        numpy.ndarray (n_frames, n_pixels)
+            The power of the signals, in the same scale as the input of
+            `blinky_non_linearity`
+        """
+        y = self.normalize(signals, locations)
+
+        # the columns are not contiguous, and can't be used as output buffers
+        for i, loc in enumerate(locations):
+            y[:, i] = blinky_non_linearity_inv(y[:, i], lut=self.lut(loc))
+
+        return y
+
+    def dump(self, filename):
+        """ Save the calibration to a MessagePack file """
+        content = {
+            "version": self.version,
+            "creation": self.creation,
+            "devices": [
+                {"location": list(loc), **entry} for loc, entry in self.devices.items()
+            ],
+        }
+        with open(filename, "wb") as f:
+            _pack(content, f)
+
+    @classmethod
+    def load(cls, filename):
+        """ Load a calibration from a MessagePack file """
+        with open(filename, "rb") as f:
+            content = msgpack.unpack(f, object_hook=decoder)
+
+        devices = {tuple(d.pop("location")): d for d in content.pop("devices")}
+        return cls(devices=devices, **content)
+
+
+def calibrate(
+    bfile,
+    period_sec=CALIB_PERIOD_SEC,
+    mapped=True,
+    periods=None,
+    color="white",
+    cache=None,
+):
+    """
+    Fit the look-up tables of all the devices in a recording of the
+    calibration ramps
+
+    Parameters
+    ----------
+    bfile: str or BlinkyFile
+        The recording, or the name of the file
+    period_sec: float, optional
+        The length of the ramp in seconds, if None, it is estimated from the
+        signals
+    mapped: bool, optional
+        True if the ramp went through the non-linearity (`CALIBRATION_RAMP_MAP`),
+        False if the ramp was linear (`CALIBRATION_RAMP`)
+    periods: list of int, optional
+        The index of the periods to use (default to all)
+    color: str, optional
+        The color of the LED to fit, "white" (default) or "red", or None
+        to average both
+    cache: str, optional
+        The name of a calibration file, if it exists, the new devices are
+        added to it, and it is saved
+
+    Returns
+    -------
+    Calibration
+        The calibration of the devices in the recording (and in the cache)
+    """
+    if isinstance(bfile, str):
+        bfile = BlinkyFile.load(bfile)
+
+    signals = reduce_boxes(bfile.data)
+    period = period_sec * bfile.fps if period_sec is not None else None
+
+    luts, lo, hi = fit_ramp(
+        signals, period=period, mapped=mapped, periods=periods, color=color
+    )
+
+    devices = {}
+    for loc, lut, l, h in zip(bfile.locations, luts, lo, hi):
+        if np.any(np.isnan(lut)):
+            print(f"Warning: calibration failed for the device at {pixel_to_str(loc)}")
+            continue
+        devices[tuple(loc)] = {"lut": lut, "lo": l, "hi": h}
+
+    if cache is not None and os.path.exists(cache):
+        calib = Calibration.load(cache)
+        calib.update(devices)
+    else:
+        calib = Calibration(devices=devices)
+
+    if cache is not None:
+        calib.dump(cache)
+
+    return calib
@@ -0,0 +1,221 @@
+# Copyright 2020 Robin Scheibler
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+This file contains the automatic detection of the Blinkies in a short clip,
+e.g., recorded while the devices are in the `WHITE_CALIBRATION` mode
+(blinking) or the `RED_BLUE_DOUBLE_REF` mode (constantly lit)
+
+Statistics of every pixel over time are computed in a streaming fashion.
+The pixels standing out of the background are grouped into connected
+components, and the centroid of every component is a candidate location.
+
+    from blinkytools.detect import detect
+
+    locations, scores = detect("calibration.mp4")
+"""
+import time
+
+import cv2
+import numpy as np
+
+from .calibration import CALIB_PERIOD_SEC
+from .processors import OnlineStats
+from .video import ThreadedVideoStream
+
+# The statistics of the pixels used to find the Blinkies,
+# "std" and "range" for blinking devices, "mean" for lit devices
+STATISTICS = ["std", "range", "mean"]
+
+# The number of frames read at once
+BATCH_SIZE = 32
+
+
+def score_map(stats, statistic="std"):
+    """
+    The map of the pixels where to look for the Blinkies
+
+    Parameters
+    ----------
+    stats: blinkytools.processors.OnlineStats
+        The statistics of the pixels of the clip
+    statistic: str, optional
+        The statistic used, one of `STATISTICS`
+
+    Returns
+    -------
+    numpy.ndarray (height, width)
+        The score of every pixel
+    """
+    if statistic == "std":
+        score = np.sqrt(stats.var)
+    elif statistic == "range":
+        score = stats.max - stats.min
+    elif statistic == "mean":
+        score = stats.mean
+    else:
+        raise ValueError(
+            "The statistic should be one of {}".format(", ".join(STATISTICS))
+        )
+
+    return score.astype(np.float32)
+
+
+def find_blinkies(
+    score, threshold=None, n_sigma=8.0, blob_size=9, min_distance=2, max_candidates=None
+):
+    """
+    Find the Blinkies in a map of the pixels
+
+    Parameters
+    ----------
+    score: array_like (height, width)
+        The score of every pixel, e.g., from `score_map`
+    threshold: float, optional
+        The score above which pixels are part of a Blinky, after the
+        background is removed (default to `n_sigma` times the deviation of
+        the background)
+    n_sigma: float, optional
+        The threshold in number of standard deviations of the background,
+        estimated robustly
+    blob_size: int, optional
+        The largest size of a Blinky in the image, in pixels, larger bright
+        regions are part of the background
+    min_distance: int, optional
+        The components closer than this, in pixels, are merged into a
+        single Blinky
+    max_candidates: int, optional
+        The largest number of candidates returned
+
+    Returns
+    -------
+    locations: list of tuples
+        The locations `(col, row)` of the candidates, from the strongest
+    scores: numpy.ndarray
+        The sum over the pixels of the candidates of the score above the threshold
+    """
+    score = np.asarray(score, dtype=np.float32)
+
+    # remove the smooth variations and the large regions of the background
+    kernel = np.ones((blob_size, blob_size), dtype=np.uint8)
+    score = cv2.morphologyEx(score, cv2.MORPH_TOPHAT, kernel)
+
+    if threshold is None:
+        # the median absolute deviation of a subset of the pixels is enough
+        sample = score[::4, ::4]
+        median = np.median(sample)
+        sigma = 1.4826 * np.median(np.abs(sample - median))
+        threshold = median + n_sigma * max(sigma, 1e-3 * np.max(score))
+
+    mask = (score > threshold).astype(np.uint8)
+
+    # the components are labeled on the dilated mask to merge the close ones
+    if min_distance > 0:
+        size = 2 * min_distance + 1
+        dilated = cv2.dilate(mask, np.ones((size, size), dtype=np.uint8))
+    else:
+        dilated = mask
+    n_labels, labels = cv2.connectedComponents(dilated, connectivity=8)
+
+    rows, cols = np.nonzero(mask)
+    labels = labels[rows, cols]
+    weights = score[rows, cols] - threshold
+
+    strength = np.bincount(labels, weights=weights, minlength=n_labels)[1:]
+    col = np.bincount(labels, weights=weights * cols, minlength=n_labels)[1:]
+    row = np.bincount(labels, weights=weights * rows, minlength=n_labels)[1:]
+
+    # the label 0 is the background
+    order = np.argsort(-strength, kind="stable")
+    if max_candidates is not None:
+        order = order[:max_candidates]
+
+    locations = [
+        (int(round(col[i] / strength[i])), int(round(row[i] / strength[i])))
+        for i in order
+    ]
+
+    return locations, strength[order]
+
+
+def detect(
+    video, n_frames=None, start=0, statistic="std", batch_size=BATCH_SIZE, **kwargs
+):
+    """
+    Detect the Blinkies in a clip
+
+    Parameters
+    ----------
+    video: int or str
+        The index of a video stream or the name of a video file
+    n_frames: int, optional
+        The number of frames used (default to one period of the
+        calibration modes of the firmware)
+    start: int, optional
+        The first frame to read
+    statistic: str, optional
+        The statistic of the pixels used, one of `STATISTICS`, "std" or
+        "range" for blinking devices, "mean" for devices constantly lit
+    batch_size: int, optional
+        The number of frames processed at once
+    **kwargs:
+        The options of `find_blinkies`
+
+    Returns
+    -------
+    locations: list of tuples
+        The locations `(col, row)` of the candidates, from the strongest,
+        e.g., to add to the list of pixels of the viewer
+    scores: numpy.ndarray
+        The strength of the candidates
+    """
+    if statistic not in STATISTICS:
+        raise ValueError(
+            "The statistic should be one of {}".format(", ".join(STATISTICS))
+        )
+
+    with ThreadedVideoStream(video, start=start, color_mode="gray") as stream:
+        if n_frames is None:
+            if not stream.fps > 0:
+                raise ValueError(
+                    "The framerate is unknown, the number of frames should be provided"
+                )
+            n_frames = int(round(CALIB_PERIOD_SEC * stream.fps))
+
+        stats = OnlineStats(stream.shape[:2], dtype=np.float32)
+
+        count = 0
+        while count < n_frames:
+            frames = stream.read_batch(min(batch_size, n_frames - count))
+
+            if frames is not None:
+                # the statistics are computed while the next frames are read
+                stats.process(frames)
+                count += frames.shape[0]
+            elif not stream.is_streaming and len(stream) == 0:
+                break
+
+    if count == 0:
+        raise ValueError("No frame could be read from {}".format(video))
+
+    while len(stats) > 0:
+        time.sleep(0.01)
+    stats.stop()
+
+    return find_blinkies(score_map(stats, statistic), **kwargs)
@@ -0,0 +1,244 @@
+# Copyright 2020 Robin Scheibler
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+This file contains an offline extraction of the Blinky signals from
+video files, where segments of the video are decoded in parallel
+
+The video is split into as many ranges of frames as there are workers.
+Each worker decodes its range with its own capture and collects the boxes
+around the pixels into a temporary file. The segments are then stitched
+in order into a single Blinky file.
+
+    from blinkytools.extract import extract
+
+    content = extract("video.mp4", pixels, box_size=(3, 3), output="video.blinky")
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from .io import DEFAULT_CHUNK_SIZE, BlinkyFile, BlinkyFileWriter
+from .processors import BoxCatcher
+from .video import ThreadedVideoStream
+
+# The number of frames read at once by the workers
+BATCH_SIZE = 32
+
+
+def video_length(video):
+    """ The number of frames and the framerate of a video file """
+    capture = cv2.VideoCapture(video)
+    if not capture.isOpened():
+        raise ValueError("Could not open the video file {}".format(video))
+
+    n_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    capture.release()
+
+    return n_frames, fps
+
+
+def split_frames(start, end, n_segments):
+    """
+    Split a range of frames into contiguous segments of similar lengths
+
+    Returns
+    -------
+    list of tuples
+        The start and end (not included) frames of the segments
+    """
+    bounds = np.linspace(start, end, n_segments + 1).round().astype(int).tolist()
+    return [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if e > s]
+
+
+def extract_segment(video, start, end, pixels, box_size, filename, reduce="raw"):
+    """
+    Collect the boxes around the pixels in a range of frames of a video
+    and save them in a Blinky file
+
+    Parameters
+    ----------
+    video: str
+        The name of the video file
+    start: int
+        The first frame to read
+    end: int
+        The frame where to stop reading (not included), if None,
+        the video is read to the end
+    pixels: list of tuples
+        The location of the pixels to collect in the image
+    box_size: list or tuple of two int
+        The width and height of the boxes
+    filename: str
+        The name of the Blinky file where to save the boxes
+    reduce: str, optional
+        The reduction of the boxes, see `BoxCatcher`
+
+    Returns
+    -------
+    int
+        The number of frames collected
+    """
+    # the boxes are reordered, rather than converting the full frames
+    with ThreadedVideoStream(video, start=start, end=end, color_mode="bgr") as stream:
+        writer = BlinkyFileWriter(filename, pixels, stream.fps)
+        catcher = BoxCatcher(
+            pixels,
+            box_size,
+            writer=writer,
+            channel_order=stream.channel_order,
+            reduce=reduce,
+        )
+
+        while True:
+            frames, timestamps = stream.read_batch(BATCH_SIZE, timestamps=True)
+
+            if frames is not None:
+                catcher.process_batch(frames, timestamps=timestamps)
+            elif not stream.is_streaming and len(stream) == 0:
+                break
+
+        # wait for the boxes of all the frames
+        while len(catcher) > 0:
+            time.sleep(0.01)
+
+        catcher.stop()
+        writer.close()
+
+    return catcher.n_frames
+
+
+def extract(
+    video,
+    pixels,
+    box_size,
+    output=None,
+    start=0,
+    end=None,
+    n_workers=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    codec=None,
+    reduce="raw",
+):
+    """
+    Extract the signals of the Blinkies from a video file, decoding segments
+    of the video in parallel
+
+    Parameters
+    ----------
+    video: str
+        The name of the video file
+    pixels: list of tuples
+        The location of the pixels to collect in the image
+    box_size: list or tuple of two int
+        The width and height of the boxes
+    output: str, optional
+        The name of the Blinky file where to save the signals, if not provided,
+        the signals are kept in memory
+    start: int, optional
+        The first frame to read
+    end: int, optional
+        The frame where to stop reading (not included), default to the end
+        of the video
+    n_workers: int, optional
+        The number of processes decoding the video (default to the number
+        of CPUs)
+    chunk_size: int, optional
+        The number of frames per chunk of the output file
+    codec: str, optional
+        The codec used to compress the chunks of the output file
+    reduce: str, optional
+        The reduction of the boxes, see `BoxCatcher`, e.g., "mean" to only
+        store the average of every box
+
+    Returns
+    -------
+    BlinkyFile
+        The signals, memory mapped from `output` if it was provided
+    """
+    n_frames, fps = video_length(video)
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    if end is None or end > n_frames:
+        end = n_frames
+
+    segments = split_frames(start, end, n_workers)
+
+    # the frame count of some files is only an estimate,
+    # the last segment is read to the end of the video
+    if len(segments) > 0 and end == n_frames:
+        segments[-1] = (segments[-1][0], None)
+
+    metadata = {
+        "video": os.path.basename(video),
+        "box_size": list(box_size),
+        "reduce": reduce,
+    }
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output) if output else None) as tmp:
+
+        parts = [
+            os.path.join(tmp, "segment_{:04d}.blinky".format(i))
+            for i in range(len(segments))
+        ]
+
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [
+                pool.submit(
+                    extract_segment, video, s, e, pixels, box_size, part, reduce
+                )
+                for (s, e), part in zip(segments, parts)
+            ]
+            counts = [future.result() for future in futures]
+
+        # segments past the end of the video are empty
+        parts = [part for part, count in zip(parts, counts) if count > 0]
+        if len(parts) == 0:
+            raise ValueError("No frame could be read from {}".format(video))
+
+        if output is None:
+            parts = [BlinkyFile.load(part) for part in parts]
+            return BlinkyFile(
+                pixels,
+                np.concatenate([p.data for p in parts], axis=0),
+                fps,
+                timestamps=np.concatenate([p.timestamps for p in parts], axis=0),
+                **metadata
+            )
+
+        # stitch the segments in order
+        with BlinkyFileWriter(
+            output, pixels, fps, chunk_size=chunk_size, codec=codec, **metadata
+        ) as writer:
+            for part in parts:
+                part = BlinkyFile.load(part, mmap=True)
+                for i in range(0, part.data.shape[0], chunk_size):
+                    writer.write(
+                        part.data[i : i + chunk_size],
+                        timestamps=part.timestamps[i : i + chunk_size],
+                    )
+
+    return BlinkyFile.load(output, mmap=True)
@@ -35,10 +35,10 @@ except ImportError:
     icube_sdk_available = False
 
 from .gui_utils import *
-from .video import ThreadedVideoStream
+from .video import ThreadedVideoStream, detect_drops, estimate_fps
 from .processors import ReadSpeedMonitor, BoxCatcher
 from .utils import pixel_to_str
-from .io import BlinkyFile
+from .io import BlinkyFile, BlinkyFileWriter
 
 
 def toggle(x: bool):
@@ -256,7 +256,7 @@ class BlinkyViewer(object):
             self.vid.stop()
 
         if not self.industrial:
-            self.vid = ThreadedVideoStream(self.video_source)
+            self.vid = ThreadedVideoStream(self.video_source, color_mode="bgr")
         else:
             if not icube_sdk_available:
                 raise ValueError("The Driver for the DN3V camera is not available")
@@ -293,15 +293,22 @@ class BlinkyViewer(object):
 
         # Get a frame from the video source
         while self.vid.available:
-            new_frame = np.array(self.vid.read(block=False), copy=False)
+            if isinstance(self.vid, ThreadedVideoStream):
+                new_frame, stamp = self.vid.read(block=False, timestamps=True)
+            else:
+                new_frame, stamp = self.vid.read(block=False), None
 
             if new_frame is None:
                 break
 
+            new_frame = np.asarray(new_frame)
+
             if self.processor is not None:
-                self.processor.process(new_frame)
+                self.processor.process(new_frame, timestamps=stamp)
 
-            self.pixel_tracker.push(new_frame)
+            self.pixel_tracker.push(
+                new_frame, channel_order=getattr(self.vid, "channel_order", "RGB")
+            )
 
         # If the video stream stopped, restart it
         if not self.vid.is_streaming:
@@ -324,6 +331,11 @@ class BlinkyViewer(object):
 
             self.pixel_tracker.update()
 
+            # the frames are processed in the order of the decoder, only the
+            # frame displayed is converted
+            if frame.ndim == 3 and getattr(self.vid, "channel_order", "RGB") == "BGR":
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
             if frame.ndim == 2:
                 frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2RGB)
 
@@ -427,13 +439,21 @@ class BlinkyViewer(object):
                 if self.processor is not None:
                     self.processor.stop()
 
+                # the frames are written to file during the recording
+                writer = BlinkyFileWriter(
+                    self.output_filename, pixel_list, self.vid.fps
+                )
                 self.processor = BoxCatcher(
-                    pixel_list, [bbox, bbox], monitor=True
+                    pixel_list,
+                    [bbox, bbox],
+                    monitor=True,
+                    writer=writer,
+                    channel_order=getattr(self.vid, "channel_order", "RGB"),
                 )
 
                 # If the video is from a file, we restart
                 if not isinstance(self.video_source, int):
-                    self.vid = ThreadedVideoStream(self.video_source)
+                    self.vid = ThreadedVideoStream(self.video_source, color_mode="bgr")
 
                 self.btn_process.config(text=STOP_LABEL)
                 self.process_record_start_time = time.perf_counter()
@@ -449,14 +469,31 @@ class BlinkyViewer(object):
                 # stop the processor
                 self.processor.stop()
 
-                recording_time = time.perf_counter() - self.process_record_start_time
-                fps = self.processor.data.shape[0] / recording_time
-
-                # save the result in blinky file
-                new_file = BlinkyFile(
-                    self.processor.pixels, self.processor.data, fps
-                )
-                new_file.dump(self.output_filename)
+                # the framerate is estimated from the last frames
+                fps = None
+                if len(self.processor.recent_timestamps) > 1:
+                    fps = estimate_fps(np.array(self.processor.recent_timestamps))
+
+                if fps is None:
+                    recording_time = (
+                        time.perf_counter() - self.process_record_start_time
+                    )
+                    fps = self.processor.n_frames / recording_time
+
+                # finish writing the blinky file
+                writer = self.processor.writer
+                writer.close(fps=fps)
+
+                # the timestamps of all the frames are read back from the file
+                timestamps = BlinkyFile.load(writer.filename, mmap=True).timestamps
+                if timestamps is not None:
+                    drops = detect_drops(timestamps, fps=fps)
+                    n_missing = int(np.sum(drops["n_missing"]))
+                    n_duplicates = len(drops["duplicates"])
+                    if n_missing > 0 or n_duplicates > 0:
+                        self.log(
+                            f"{n_missing} frames dropped, {n_duplicates} duplicated"
+                        )
 
                 # Replace by the simple speed meter
                 self.processor = ReadSpeedMonitor(monitor=True)
@@ -485,6 +522,11 @@ class BlinkyViewer(object):
 
     def on_closing_callback(self):
         self.log("Goodbye!")
+
+        # save the ongoing recording
+        if self.process_is_recording():
+            self.process_callback()
+
         self.vid.stop()
         if self.processor is not None:
             self.processor.stop()
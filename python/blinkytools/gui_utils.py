@@ -90,6 +90,11 @@ class PixelList(Frame):
             self.pixels[label] = pixel
             self.list.insert(END, label)
 
+    def extend(self, pixels):
+        """ Add several pixels to the list, e.g., from `detect.detect` """
+        for pixel in pixels:
+            self.add(tuple(pixel))
+
     def get(self):
         """ Return the list of pixels """
         return list(self.pixels.values())
@@ -261,17 +266,20 @@ class PixelTracker(object):
         self.col = col
         self.values = [0 for i in range(self.buffer_size)]
 
-    def push(self, frame):
+    def push(self, frame, channel_order="RGB"):
 
         for lbl, pxl in self.pixels.items():
 
             col, row = pxl["loc"]
 
             # Make the value grayscale if it isn't already
-            if frame.ndim == 3:
-                value = cv2.cvtColor(
-                    frame[row, col, None, None, :], cv2.COLOR_RGB2GRAY
-                )[0, 0]
+            if frame.ndim == 3 and frame.shape[2] > 1:
+                code = (
+                    cv2.COLOR_BGR2GRAY if channel_order == "BGR" else cv2.COLOR_RGB2GRAY
+                )
+                value = cv2.cvtColor(frame[row, col, None, None, :], code)[0, 0]
+            elif frame.ndim == 3:
+                value = frame[row, col, 0]
             elif frame.ndim == 2:
                 value = frame[row, col]
             else:
@@ -0,0 +1,458 @@
+# Copyright 2020 Robin Scheibler
+# 
+# Permission is hereby granted, free of charge, to any person obtaining a copy of
+# this software and associated documentation files (the "Software"), to deal in
+# the Software without restriction, including without limitation the rights to
+# use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies
+# of the Software, and to permit persons to whom the Software is furnished to do
+# so, subject to the following conditions:
+# 
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+# 
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+"""
+This file defines a catalog of a collection of Blinky files
+
+The catalog is a SQLite database with one row per recording and one row
+per Blinky location. It is built from the headers of the files only, so
+that it can be updated quickly, and only the files modified since the
+last update are read again. Optionally, summary statistics of the signals
+can be computed and stored in the catalog as well.
+
+    python -m blinkytools.index update <directory>
+    python -m blinkytools.index query --near 320 240 --min-duration 600
+"""
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .io import BlinkyFile
+
+DEFAULT_INDEX = "blinky_index.db"
+
+# Number of frames read at once to compute the statistics
+_STATS_BLOCK_SIZE = 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    creation TEXT,
+    version TEXT,
+    fps REAL,
+    n_frames INTEGER,
+    duration REAL,
+    n_pixels INTEGER,
+    shape TEXT,
+    dtype TEXT,
+    codec TEXT,
+    has_stats INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS locations (
+    path TEXT REFERENCES recordings(path) ON DELETE CASCADE,
+    pixel INTEGER,
+    col INTEGER,
+    row INTEGER,
+    mean REAL,
+    std REAL,
+    min REAL,
+    max REAL,
+    PRIMARY KEY (path, pixel)
+);
+CREATE INDEX IF NOT EXISTS locations_col_row ON locations (col, row);
+CREATE TABLE IF NOT EXISTS unreadable (
+    path TEXT PRIMARY KEY,
+    mtime REAL,
+    size INTEGER,
+    error TEXT
+);
+"""
+
+
+def connect(filename=DEFAULT_INDEX):
+    """ Open the catalog, creating it if necessary """
+    db = sqlite3.connect(filename)
+    db.execute("PRAGMA foreign_keys = ON")
+    db.executescript(_SCHEMA)
+
+    # catalogs created before the statistics were tracked
+    columns = [c[1] for c in db.execute("PRAGMA table_info(recordings)")]
+    if "has_stats" not in columns:
+        with db:
+            db.execute("ALTER TABLE recordings ADD COLUMN has_stats INTEGER DEFAULT 0")
+
+    return db
+
+
+def signal_stats(filename):
+    """
+    Summary statistics of the signals of a file, averaged over the boxes and colors
+
+    Returns
+    -------
+    dict of numpy.ndarray (n_pixels,)
+        The mean, standard deviation, minimum, and maximum of every signal
+    """
+    data = BlinkyFile.load(filename, mmap=True).data
+    n_frames, n_pixels = data.shape[:2]
+
+    total = np.zeros(n_pixels)
+    total_sq = np.zeros(n_pixels)
+    lo = np.full(n_pixels, np.inf)
+    hi = np.full(n_pixels, -np.inf)
+
+    for start in range(0, n_frames, _STATS_BLOCK_SIZE):
+        block = np.asarray(data[start : start + _STATS_BLOCK_SIZE], dtype=np.float64)
+        block = block.reshape(block.shape[:2] + (-1,)).mean(axis=-1)
+        total += block.sum(axis=0)
+        total_sq += (block ** 2).sum(axis=0)
+        lo = np.minimum(lo, block.min(axis=0))
+        hi = np.maximum(hi, block.max(axis=0))
+
+    if n_frames == 0:
+        nan = np.full(n_pixels, np.nan)
+        return {"mean": nan, "std": nan, "min": nan, "max": nan}
+
+    mean = total / n_frames
+    std = np.sqrt(np.maximum(total_sq / n_frames - mean ** 2, 0.0))
+
+    return {"mean": mean, "std": std, "min": lo, "max": hi}
+
+
+def read_entry(path, stats=False):
+    """
+    Read the information about a file to store in the catalog
+
+    Parameters
+    ----------
+    path: str
+        The file name
+    stats: bool, optional
+        If True, the summary statistics of the signals are computed, which
+        requires to read the whole file
+
+    Returns
+    -------
+    recording: dict
+        The row of the recordings table
+    locations: list of dict
+        The rows of the locations table
+    """
+    st = os.stat(path)
+    info = BlinkyFile.info(path)
+
+    n_frames = info["shape"][0]
+    fps = info["fps"]
+
+    recording = {
+        "path": path,
+        "mtime": st.st_mtime,
+        "size": st.st_size,
+        "creation": info["creation"],
+        "version": info["version"],
+        "fps": fps,
+        "n_frames": n_frames,
+        "duration": n_frames / fps if fps else None,
+        "n_pixels": len(info["locations"]),
+        "shape": str(tuple(info["shape"])),
+        "dtype": info["dtype"].str,
+        "codec": info["codec"],
+        "has_stats": int(stats),
+    }
+
+    if stats:
+        values = signal_stats(path)
+    else:
+        values = None
+
+    locations = []
+    for i, loc in enumerate(info["locations"]):
+        row = {"path": path, "pixel": i, "col": int(loc[0]), "row": int(loc[1])}
+        for key in ["mean", "std", "min", "max"]:
+            row[key] = float(values[key][i]) if values is not None else None
+        locations.append(row)
+
+    return recording, locations
+
+
+def _read_entry_safe(args):
+    """ Wrapper for the process pool, the errors are returned rather than raised """
+    path, stats = args
+    try:
+        return path, read_entry(path, stats=stats), None
+    except Exception as e:
+        return path, None, "{}: {}".format(type(e).__name__, e)
+
+
+def find_files(root, extension=".blinky"):
+    """ All the files with the extension in the directory tree """
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for f in filenames:
+            if f.endswith(extension):
+                files.append(os.path.abspath(os.path.join(dirpath, f)))
+    return sorted(files)
+
+
+def update(db, root, stats=False, n_workers=None, verbose=False):
+    """
+    Update the catalog with the Blinky files of a directory tree
+
+    Only the files added or modified since the last update are read, or the
+    files without statistics if `stats` is True, and the files that were
+    deleted are removed from the catalog. The files that could not be read
+    are recorded in the `unreadable` table and only read again once modified.
+
+    Parameters
+    ----------
+    db: sqlite3.Connection
+        The catalog
+    root: str
+        The directory to scan
+    stats: bool, optional
+        If True, summary statistics of the signals are computed
+    n_workers: int, optional
+        The number of processes used to read the files (default to the
+        number of processors)
+    verbose: bool, optional
+        Print the errors
+
+    Returns
+    -------
+    n_updated: int
+        The number of files added or updated
+    n_removed: int
+        The number of files removed
+    """
+    files = find_files(root)
+
+    known = {
+        path: (mtime, size, has_stats)
+        for path, mtime, size, has_stats in db.execute(
+            "SELECT path, mtime, size, has_stats FROM recordings"
+        )
+    }
+    unreadable = {
+        path: (mtime, size)
+        for path, mtime, size in db.execute("SELECT path, mtime, size FROM unreadable")
+    }
+
+    todo = []
+    for path in files:
+        st = os.stat(path)
+        version = (st.st_mtime, st.st_size)
+        if path in known:
+            stale = known[path][:2] != version or (stats and not known[path][2])
+        else:
+            stale = unreadable.get(path) != version
+        if stale:
+            todo.append((path, stats))
+
+    # remove the files that disappeared from this directory tree
+    prefix = os.path.join(os.path.abspath(root), "")
+    existing = set(files)
+    removed = [p for p in known if p.startswith(prefix) and p not in existing]
+    with db:
+        db.executemany("DELETE FROM recordings WHERE path = ?", [(p,) for p in removed])
+        db.executemany(
+            "DELETE FROM unreadable WHERE path = ?",
+            [(p,) for p in unreadable if p.startswith(prefix) and p not in existing],
+        )
+
+    n_updated = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for path, entry, error in pool.map(_read_entry_safe, todo, chunksize=16):
+
+            if error is not None:
+                if verbose:
+                    print("Could not read {} ({})".format(path, error), file=sys.stderr)
+
+                # the file is only read again once modified
+                st = os.stat(path)
+                with db:
+                    db.execute("DELETE FROM recordings WHERE path = ?", (path,))
+                    db.execute(
+                        "INSERT OR REPLACE INTO unreadable VALUES (?, ?, ?, ?)",
+                        (path, st.st_mtime, st.st_size, error),
+                    )
+                continue
+
+            recording, locations = entry
+            with db:
+                db.execute("DELETE FROM unreadable WHERE path = ?", (path,))
+                db.execute("DELETE FROM recordings WHERE path = ?", (path,))
+                db.execute(
+                    "INSERT INTO recordings ({}) VALUES ({})".format(
+                        ", ".join(recording), ", ".join(["?"] * len(recording))
+                    ),
+                    list(recording.values()),
+                )
+                if len(locations) > 0:
+                    db.executemany(
+                        "INSERT INTO locations ({}) VALUES ({})".format(
+                            ", ".join(locations[0]), ", ".join(["?"] * len(locations[0]))
+                        ),
+                        [list(loc.values()) for loc in locations],
+                    )
+            n_updated += 1
+
+    return n_updated, len(removed)
+
+
+def query(
+    db,
+    near=None,
+    radius=5.0,
+    min_duration=None,
+    max_duration=None,
+    after=None,
+    before=None,
+):
+    """
+    Find the recordings in the catalog matching some criteria
+
+    Parameters
+    ----------
+    db: sqlite3.Connection
+        The catalog
+    near: tuple of int, optional
+        Only the recordings with a Blinky closer than `radius` to this pixel
+    radius: float, optional
+        The maximum distance in pixels to `near`
+    min_duration: float, optional
+        Minimum duration in seconds
+    max_duration: float, optional
+        Maximum duration in seconds
+    after: str, optional
+        Only the files created after this date (ISO format)
+    before: str, optional
+        Only the files created before this date (ISO format)
+
+    Returns
+    -------
+    list of dict
+        The rows of the recordings table matching the criteria
+    """
+    conditions = []
+    params = []
+
+    if near is not None:
+        # the bounding box allows to use the index on the locations
+        conditions.append(
+            "path IN (SELECT path FROM locations "
+            "WHERE col BETWEEN ? AND ? AND row BETWEEN ? AND ? "
+            "AND (col - ?) * (col - ?) + (row - ?) * (row - ?) <= ?)"
+        )
+        col, row = near
+        params += [col - radius, col + radius, row - radius, row + radius]
+        params += [col, col, row, row, radius ** 2]
+
+    for cond, value in [
+        ("duration >= ?", min_duration),
+        ("duration <= ?", max_duration),
+        ("creation >= ?", after),
+        ("creation <= ?", before),
+    ]:
+        if value is not None:
+            conditions.append(cond)
+            params.append(value)
+
+    sql = "SELECT * FROM recordings"
+    if len(conditions) > 0:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY creation"
+
+    cursor = db.execute(sql, params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, r)) for r in cursor.fetchall()]
+
+
+def index_main():
+    """
+    Build and query the catalog of a collection of Blinky files
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build and query a catalog of Blinky files"
+    )
+    parser.add_argument(
+        "--db", type=str, default=DEFAULT_INDEX, help="The catalog file name"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    parser_update = subparsers.add_parser(
+        "update", help="Add the new and modified files of a directory"
+    )
+    parser_update.add_argument("root", type=str, help="The directory to scan")
+    parser_update.add_argument(
+        "--stats",
+        action="store_true",
+        help="Compute summary statistics of the signals (reads the whole files)",
+    )
+    parser_update.add_argument(
+        "--workers", type=int, default=None, help="Number of processes"
+    )
+
+    parser_query = subparsers.add_parser("query", help="Search the catalog")
+    parser_query.add_argument(
+        "--near", type=int, nargs=2, metavar=("COL", "ROW"), help="Pixel location"
+    )
+    parser_query.add_argument(
+        "--radius", type=float, default=5.0, help="Distance to the pixel location"
+    )
+    parser_query.add_argument(
+        "--min-duration", type=float, help="Minimum duration in seconds"
+    )
+    parser_query.add_argument(
+        "--max-duration", type=float, help="Maximum duration in seconds"
+    )
+    parser_query.add_argument("--after", type=str, help="Created after (ISO date)")
+    parser_query.add_argument("--before", type=str, help="Created before (ISO date)")
+
+    args = parser.parse_args()
+
+    db = connect(args.db)
+
+    if args.command == "update":
+        n_updated, n_removed = update(
+            db, args.root, stats=args.stats, n_workers=args.workers, verbose=True
+        )
+        print("{} files updated, {} files removed".format(n_updated, n_removed))
+
+    elif args.command == "query":
+        results = query(
+            db,
+            near=args.near,
+            radius=args.radius,
+            min_duration=args.min_duration,
+            max_duration=args.max_duration,
+            after=args.after,
+            before=args.before,
+        )
+        for r in results:
+            print(
+                "{path}  {creation}  {duration:.1f} s  {n_pixels} blinkies".format(
+                    **{**r, "duration": r["duration"] or 0.0}
+                )
+            )
+
+    else:
+        parser.print_help()
+
+    db.close()
+
+
+if __name__ == "__main__":
+    index_main()
@@ -28,7 +28,30 @@ which is suitable to efficiently save binary data.
 
 The encoder/decoder were modelled after the
 [msgpack-numpy package](https://github.com/lebedov/msgpack-numpy).
+
+Long recordings can also be stored in a chunked variant of the format
+that is written incrementally by `BlinkyFileWriter`. The file is then a
+sequence of MessagePack objects
+
+1. a header with the file attributes and the shape of a frame
+2. any number of chunks, each holding up to `chunk_size` frames
+3. a chunk index with the offset of every chunk in the file
+4. a fixed-size footer with the offset of the chunk index
+
+If the recording is interrupted, only the data since the last chunk is
+lost and the file can still be read.
+
+In the chunked format, the chunks can be compressed with one of the codecs
+of the standard library (zlib, lzma), optionally after taking the difference
+between consecutive frames (delta filter).
 """
+import json
+import lzma
+import os
+import struct
+import zlib
+from collections import OrderedDict
+
 import msgpack
 import numpy as np
 from datetime import datetime
@@ -36,6 +59,58 @@ from .version import __version__
 from .utils import pixel_to_str
 
 
+def _as_bytes(array):
+    """ The content of an array as a bytes-like object, without copy if possible """
+    if array.flags.c_contiguous and array.size > 0:
+        return memoryview(array).cast("B")
+    else:
+        return array.tobytes()
+
+
+def _bin_header(nbytes):
+    """ The header of a MessagePack bin object """
+    if nbytes < 2 ** 8:
+        return b"\xc4" + struct.pack(">B", nbytes)
+    elif nbytes < 2 ** 16:
+        return b"\xc5" + struct.pack(">H", nbytes)
+    elif nbytes < 2 ** 32:
+        return b"\xc6" + struct.pack(">I", nbytes)
+    else:
+        raise ValueError("Binary data larger than 4 GB can't be stored")
+
+
+def _pack(obj, f, packer=None):
+    """
+    Write an object to a file in MessagePack format
+
+    Unlike `msgpack.pack`, the binary data, including the content of
+    the arrays, is written directly to the file rather than copied into
+    the output of the packer first.
+    """
+    if packer is None:
+        packer = msgpack.Packer(default=encoder, use_bin_type=True)
+
+    if isinstance(obj, np.ndarray):
+        _pack(encoder(obj), f, packer)
+
+    elif isinstance(obj, ChunkedArray):
+        # e.g., the data of a file loaded with `mmap=True`
+        _pack(encoder(np.asarray(obj)), f, packer)
+
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        f.write(_bin_header(memoryview(obj).nbytes))
+        f.write(obj)
+
+    elif isinstance(obj, dict):
+        f.write(packer.pack_map_header(len(obj)))
+        for key, value in obj.items():
+            f.write(packer.pack(key))
+            _pack(value, f, packer)
+
+    else:
+        f.write(packer.pack(obj))
+
+
 def encoder(obj, chain=None):
     """ Custom encoder to store numpy.ndarray in MessagePack format """
 
@@ -48,14 +123,20 @@ def encoder(obj, chain=None):
             "__nd__": True,  # indicate this is a numpy ndarray
             "shape": obj.shape,
             "dtype": obj.dtype.str,
-            "data": obj.tobytes(),
+            "data": _as_bytes(obj),
         }
     else:
         return obj if chain is None else chain(obj)
 
 
 def decoder(obj, chain=None):
-    """ Custom decoder to recover numpy.ndarray saved in MessagePack format """
+    """
+    Custom decoder to recover numpy.ndarray saved in MessagePack format
+
+    The array is a read-only view of the unpacked bytes. Note that
+    `BlinkyFile.load` does not use it for the data, which is read directly
+    in a writable array.
+    """
 
     try:
         if "__nd__" in obj:
@@ -72,8 +153,812 @@ def decoder(obj, chain=None):
         return obj if chain is None else chain(obj)
 
 
+# Number of frames per chunk in the chunked format
+DEFAULT_CHUNK_SIZE = 1024
+
+# The footer is a MessagePack bin8 object of 16 bytes
+# containing a magic string and the offset of the chunk index
+_FOOTER_MAGIC = b"BLINKIDX"
+_FOOTER_PREFIX = b"\xc4\x10" + _FOOTER_MAGIC
+_FOOTER_SIZE = len(_FOOTER_PREFIX) + 8
+
+
+def _delta_encode(frames):
+    """ Difference between consecutive frames, computed on the raw bits """
+    x = frames.view("u{}".format(frames.dtype.itemsize))
+    y = x.copy()
+    y[1:] -= x[:-1]
+    return y.view(frames.dtype)
+
+
+def _delta_decode(frames):
+    """ Inverse of the delta filter """
+    x = frames.view("u{}".format(frames.dtype.itemsize))
+    return np.cumsum(x, axis=0, dtype=x.dtype).view(frames.dtype)
+
+
+# Filters are applied to the frames before compression
+_FILTERS = {"delta": (_delta_encode, _delta_decode)}
+
+# Compression of the bytes of a chunk
+_COMPRESSORS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+# The codecs available, i.e., a compressor optionally preceded by filters
+CODECS = list(_COMPRESSORS) + [
+    "{}+{}".format(f, c) for f in _FILTERS for c in _COMPRESSORS
+]
+
+
+def _parse_codec(codec):
+    """ Split a codec name such as 'delta+zlib' into its filters and compressor """
+    if codec not in CODECS:
+        raise ValueError(
+            "Unknown codec {}, available codecs are {}".format(codec, CODECS)
+        )
+    *filters, compressor = codec.split("+")
+    return filters, compressor
+
+
+def _encode_chunk(frames, codec):
+    """ Compress a stack of frames with a codec """
+    filters, compressor = _parse_codec(codec)
+    for f in filters:
+        frames = _FILTERS[f][0](frames)
+    return _COMPRESSORS[compressor][0](np.ascontiguousarray(frames))
+
+
+def _decode_chunk(payload, codec, n_frames, frame_shape, dtype):
+    """ Decompress a stack of frames compressed with a codec """
+    filters, compressor = _parse_codec(codec)
+    frames = np.frombuffer(_COMPRESSORS[compressor][1](payload), dtype=dtype)
+    frames = frames.reshape((n_frames,) + frame_shape)
+    for f in filters[::-1]:
+        frames = _FILTERS[f][1](frames)
+    return frames
+
+
+class BlinkyFileWriter(object):
+    """
+    Writes a Blinky file incrementally in the chunked format
+
+    The frames are accumulated in a buffer of `chunk_size` frames that is
+    written to disk whenever it is full. The memory used is thus bounded
+    by the size of one chunk, no matter how long the recording is.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the file to create
+    locations: list of tuples
+        The location of the pixels recorded
+    fps: float
+        The framerate of the signal
+    chunk_size: int, optional
+        The number of frames per chunk
+    codec: str, optional
+        The codec used to compress the chunks, one of `CODECS`
+        (default to no compression)
+    version: str, optional
+        The software version (default to current version)
+    creation: str, optional
+        The creation date in ISO format (default to now)
+    **metadata:
+        Extra metadata to store in the file
+    """
+
+    def __init__(
+        self,
+        filename,
+        locations,
+        fps,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        codec=None,
+        version=None,
+        creation=None,
+        **metadata
+    ):
+        if chunk_size <= 0:
+            raise ValueError("The chunk size should be strictly positive")
+
+        if codec is not None:
+            _parse_codec(codec)
+
+        self.filename = filename
+        self.locations = locations
+        self.fps = fps
+        self.chunk_size = chunk_size
+        self.codec = codec
+        self.version = version if version is not None else __version__
+        self.creation = (
+            creation
+            if creation is not None
+            else datetime.now().astimezone().isoformat()
+        )
+        self.metadata = metadata
+
+        # the header is written when the shape of a frame is known
+        self.frame_shape = None
+        self.dtype = None
+
+        self._buffer = None
+        self._buffer_len = 0
+        self._index = []
+        self._n_frames = 0
+
+        # the timestamps are stored with the chunks once provided,
+        # they are NaN for the frames written without timestamps
+        self._timestamps = None
+
+        # the positions of the boxes when they are tracked, see `BlinkyFile.track`,
+        # stored with the chunk index when closing the file
+        self.track = None
+
+        self._file = open(self.filename, "wb")
+
+    @property
+    def n_frames(self):
+        """ The number of frames written so far, including the buffer """
+        return self._n_frames
+
+    @property
+    def closed(self):
+        return self._file is None
+
+    def _write_header(self, frame_shape, dtype):
+
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+
+        assert self.dtype.kind != "V", "Unsupported non-numeric type"
+
+        if len(self.frame_shape) == 0 or self.frame_shape[0] != len(self.locations):
+            raise ValueError(
+                "The number of locations should correspond to the "
+                "number of signals recorded."
+            )
+
+        header = {
+            "__chunked__": True,
+            "locations": self.locations,
+            "fps": self.fps,
+            "version": self.version,
+            "creation": self.creation,
+            "metadata": self.metadata,
+            "frame_shape": self.frame_shape,
+            "dtype": self.dtype.str,
+            "chunk_size": self.chunk_size,
+            "codec": self.codec,
+        }
+        _pack(header, self._file)
+
+        self._buffer = np.empty((self.chunk_size,) + self.frame_shape, dtype=self.dtype)
+
+    def write(self, frames, timestamps=None):
+        """
+        Append frames to the file
+
+        Parameters
+        ----------
+        frames: array_like (n_frames, n_pixels, ...)
+            A stack of frames, the first dimension is time
+        timestamps: array_like (n_frames, n_fields), optional
+            The timestamps of the frames, e.g., from `ThreadedVideoStream`
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+        frames = np.asarray(frames)
+
+        if self._buffer is None:
+            self._write_header(frames.shape[1:], frames.dtype)
+
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(
+                "The frames should have shape (n_frames,) + {}".format(self.frame_shape)
+            )
+
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps, dtype=np.float64)
+            if timestamps.shape[0] != frames.shape[0]:
+                raise ValueError("There should be one timestamp per frame")
+
+            if self._timestamps is None:
+                self._timestamps = np.full(
+                    (self.chunk_size,) + timestamps.shape[1:], np.nan
+                )
+
+        n = 0
+        while n < frames.shape[0]:
+            m = min(frames.shape[0] - n, self.chunk_size - self._buffer_len)
+            self._buffer[self._buffer_len : self._buffer_len + m] = frames[n : n + m]
+            if timestamps is not None:
+                self._timestamps[self._buffer_len : self._buffer_len + m] = timestamps[
+                    n : n + m
+                ]
+            self._buffer_len += m
+            self._n_frames += m
+            n += m
+
+            if self._buffer_len == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """ Write the frames currently in the buffer as a new chunk """
+        if self._buffer_len == 0:
+            return
+
+        frames = self._buffer[: self._buffer_len]
+        if self.codec is None:
+            payload = _as_bytes(frames)
+        else:
+            payload = _encode_chunk(frames, self.codec)
+
+        offset = self._file.tell()
+        chunk = {
+            "__chunk__": True,
+            "n_frames": self._buffer_len,
+            "data": payload,
+        }
+        if self._timestamps is not None:
+            chunk["timestamps"] = self._timestamps[: self._buffer_len]
+        _pack(chunk, self._file)
+        self._file.flush()
+
+        self._index.append([offset, self._buffer_len])
+        self._buffer_len = 0
+
+        if self._timestamps is not None:
+            self._timestamps[:] = np.nan
+
+    def close(self, fps=None, track=None):
+        """
+        Write the remaining frames and the chunk index, then close the file
+
+        Parameters
+        ----------
+        fps: float, optional
+            If provided, replaces the framerate given at creation,
+            e.g., when it is only estimated at the end of the recording
+        track: dict, optional
+            The positions of the boxes over time, see `BlinkyFile.track`
+        """
+        if self.closed:
+            return
+
+        if self._buffer is None:
+            # nothing was recorded
+            self._write_header((len(self.locations),), np.uint8)
+
+        self.flush()
+
+        index = {"__index__": self._index}
+        if fps is not None:
+            self.fps = fps
+            index["fps"] = fps
+
+        if track is not None:
+            self.track = track
+        if self.track is not None:
+            index["track"] = self.track
+
+        index_offset = self._file.tell()
+        _pack(index, self._file)
+        self._file.write(_FOOTER_PREFIX + struct.pack(">Q", index_offset))
+
+        self._file.close()
+        self._file = None
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Number of bytes read ahead when parsing the headers
+_HEADER_READ_SIZE = 4096
+
+# Size of the length field of the MessagePack bin types
+_BIN_LENGTH_SIZE = {b"\xc4": 1, b"\xc5": 2, b"\xc6": 4}
+
+
+class _Cursor(object):
+    """
+    Reads MessagePack objects from a file, but allows to skip over binary
+    data without reading it
+
+    Parameters
+    ----------
+    f: file object
+        A file opened in binary mode
+    offset: int, optional
+        The position where to start reading
+    """
+
+    def __init__(self, f, offset=0):
+        self.file = f
+        self.seek(offset)
+
+    def seek(self, offset):
+        # the unpacker reads ahead, so we need a new one
+        # whenever we move in the file
+        self.file.seek(offset)
+        self._base = offset
+        self._unpacker = msgpack.Unpacker(
+            self.file,
+            object_hook=decoder,
+            raw=False,
+            read_size=_HEADER_READ_SIZE,
+            max_buffer_size=0,
+        )
+
+    def tell(self):
+        return self._base + self._unpacker.tell()
+
+    def unpack(self):
+        return self._unpacker.unpack()
+
+    def read_map_header(self):
+        return self._unpacker.read_map_header()
+
+    def skip_bin(self):
+        """ Skip a binary object, returns the offset and size of its content """
+        marker = self._unpacker.read_bytes(1)
+        if len(marker) == 0:
+            raise msgpack.OutOfData()
+        elif marker not in _BIN_LENGTH_SIZE:
+            raise ValueError("Expected binary data")
+
+        length_size = _BIN_LENGTH_SIZE[marker]
+        length = self._unpacker.read_bytes(length_size)
+        if len(length) < length_size:
+            raise msgpack.OutOfData()
+
+        offset = self.tell()
+        nbytes = int.from_bytes(length, "big")
+        self.seek(offset + nbytes)
+
+        return offset, nbytes
+
+
+def _read_map(cursor, skip):
+    """
+    Read a map from the file, the values of the keys in `skip` are read
+    with the corresponding function rather than unpacked
+    """
+    n_items = cursor.read_map_header()
+    content = {}
+    for i in range(n_items):
+        key = cursor.unpack()
+        if key in skip:
+            content[key] = skip[key](cursor)
+        else:
+            content[key] = cursor.unpack()
+    return content
+
+
+def _skip_bin(cursor):
+    offset, nbytes = cursor.skip_bin()
+    return {"offset": offset, "nbytes": nbytes}
+
+
+def _skip_ndarray(cursor):
+    """ Read the description of an ndarray saved by the `encoder`, but not its content """
+    content = _read_map(cursor, {"data": _skip_bin})
+    if "__nd__" not in content:
+        raise ValueError("Expected a numpy array")
+    return content
+
+
+def _read_footer(f, file_size):
+    """ Returns the offset of the chunk index, or None if there is no footer """
+    if file_size < _FOOTER_SIZE:
+        return None
+
+    f.seek(file_size - _FOOTER_SIZE)
+    footer = f.read(_FOOTER_SIZE)
+    if not footer.startswith(_FOOTER_PREFIX):
+        return None
+
+    return struct.unpack(">Q", footer[len(_FOOTER_PREFIX) :])[0]
+
+
+# The content of the chunks that is not read when parsing the layout of a file
+_CHUNK_SKIP = {"data": _skip_bin, "timestamps": _skip_ndarray}
+
+
+def _read_chunk_list(cursor, file_size):
+    """
+    Find the location of the chunks following the header in the chunked format
+
+    The chunk index is used when available. Otherwise, the chunks are scanned
+    until the end of the file and chunks that were not completely written,
+    e.g. at the end of an interrupted recording, are ignored.
+
+    Returns
+    -------
+    chunks: list of dict
+        The offset and size of the content of the chunks and their number of frames
+    attrs: dict
+        The attributes stored with the chunk index
+    """
+    index_offset = _read_footer(cursor.file, file_size)
+
+    if index_offset is not None:
+        cursor.seek(index_offset)
+        attrs = cursor.unpack()
+        offsets = [entry[0] for entry in attrs.pop("__index__")]
+
+        chunks = []
+        for offset in offsets:
+            cursor.seek(offset)
+            chunks.append(_read_map(cursor, _CHUNK_SKIP))
+
+    else:
+        attrs = {}
+
+        chunks = []
+        while True:
+            try:
+                chunk = _read_map(cursor, _CHUNK_SKIP)
+            except (msgpack.OutOfData, ValueError):
+                break
+
+            # the chunks, including their timestamps, should be complete
+            payloads = [chunk.get("data")]
+            if chunk.get("timestamps") is not None:
+                payloads.append(chunk["timestamps"]["data"])
+
+            if "__chunk__" not in chunk or any(
+                [p["offset"] + p["nbytes"] > file_size for p in payloads]
+            ):
+                break
+
+            chunks.append(chunk)
+
+    return [
+        {
+            "offset": c["data"]["offset"],
+            "nbytes": c["data"]["nbytes"],
+            "n_frames": c["n_frames"],
+            "timestamps": c.get("timestamps"),
+        }
+        for c in chunks
+    ], attrs
+
+
+def _read_layout(filename):
+    """
+    Read the attributes of a Blinky file and the location of the data in the
+    file without reading the data itself. Both formats are described as
+    a list of chunks, the non-chunked format having only one.
+
+    Returns
+    -------
+    header: dict
+        The attributes of the file, including the shape of one frame,
+        the data type and the codec
+    chunks: list of dict
+        The offset and size of the content of the chunks and their number of frames
+    """
+    with open(filename, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+
+        cursor = _Cursor(f)
+        header = _read_map(
+            cursor, {"data": _skip_ndarray, "timestamps": _skip_ndarray}
+        )
+
+        if "__chunked__" in header:
+            chunks, attrs = _read_chunk_list(cursor, file_size)
+            header.update(attrs)
+            for key in ["__chunked__", "chunk_size"]:
+                header.pop(key)
+
+        else:
+            array = header.pop("data")
+            header["codec"] = None
+            header["frame_shape"] = array["shape"][1:]
+            header["dtype"] = array["dtype"]
+            chunks = [
+                {
+                    "offset": array["data"]["offset"],
+                    "nbytes": array["data"]["nbytes"],
+                    "n_frames": array["shape"][0],
+                    "timestamps": header.pop("timestamps", None),
+                }
+            ]
+
+    header["frame_shape"] = tuple(header["frame_shape"])
+    header["dtype"] = np.dtype(header["dtype"])
+    header.setdefault("codec", None)
+
+    if header["codec"] is not None:
+        _parse_codec(header["codec"])
+        return header, chunks
+
+    frame_nbytes = int(np.prod(header["frame_shape"])) * header["dtype"].itemsize
+    for chunk in chunks:
+        if chunk["nbytes"] != chunk["n_frames"] * frame_nbytes:
+            raise ValueError("The size of the data does not match its shape")
+
+    return header, chunks
+
+
+def _read_data(filename, chunks, frame_shape, dtype, codec=None):
+    """ Read the data of all the chunks into a single array """
+    n_frames = sum([c["n_frames"] for c in chunks])
+    data = np.empty((n_frames,) + frame_shape, dtype=dtype)
+
+    with open(filename, "rb") as f:
+        start = 0
+        for chunk in chunks:
+            end = start + chunk["n_frames"]
+            f.seek(chunk["offset"])
+            if end == start:
+                pass
+            elif codec is None:
+                f.readinto(memoryview(data[start:end]).cast("B"))
+            else:
+                data[start:end] = _decode_chunk(
+                    f.read(chunk["nbytes"]), codec, end - start, frame_shape, dtype
+                )
+            start = end
+
+    return data
+
+
+def _read_timestamps(filename, chunks, start=None, stop=None):
+    """
+    Read the timestamps of the frames from `start` to `stop` (default to all),
+    or None if some chunks have no timestamps. Only the chunks containing
+    these frames are read.
+    """
+    if len(chunks) == 0 or any([c.get("timestamps") is None for c in chunks]):
+        return None
+
+    n_frames = sum([c["n_frames"] for c in chunks])
+    start, stop = slice(start, stop).indices(n_frames)[:2]
+
+    desc = chunks[0]["timestamps"]
+    parts = [np.empty((0,) + tuple(desc["shape"][1:]), dtype=np.dtype(desc["dtype"]))]
+
+    end = 0
+    with open(filename, "rb") as f:
+        for chunk in chunks:
+            first, end = end, end + chunk["n_frames"]
+            if end <= start or first >= stop:
+                continue
+
+            desc = chunk["timestamps"]
+            f.seek(desc["data"]["offset"])
+            stamps = np.frombuffer(
+                f.read(desc["data"]["nbytes"]), dtype=np.dtype(desc["dtype"])
+            ).reshape(desc["shape"])
+            parts.append(stamps[max(start - first, 0) : stop - first])
+
+    return np.concatenate(parts, axis=0)
+
+
+class _CompressedChunk(object):
+    """ A compressed chunk of a file that is read and decoded when indexed """
+
+    def __init__(self, filename, chunk, frame_shape, dtype, codec):
+        self.filename = filename
+        self.chunk = chunk
+        self.frame_shape = frame_shape
+        self.dtype = dtype
+        self.codec = codec
+
+    @property
+    def shape(self):
+        return (self.chunk["n_frames"],) + self.frame_shape
+
+    def __len__(self):
+        return self.chunk["n_frames"]
+
+    def __getitem__(self, key):
+        with open(self.filename, "rb") as f:
+            f.seek(self.chunk["offset"])
+            payload = f.read(self.chunk["nbytes"])
+        frames = _decode_chunk(
+            payload, self.codec, len(self), self.frame_shape, self.dtype
+        )
+        return frames[key]
+
+
+def _map_data(filename, chunks, frame_shape, dtype, codec=None):
+    """
+    Memory map the data of all the chunks, compressed chunks are
+    only read and decoded when accessed
+    """
+    if len(chunks) == 0:
+        return np.zeros((0,) + frame_shape, dtype=dtype)
+
+    if codec is not None:
+        return ChunkedArray(
+            [_CompressedChunk(filename, c, frame_shape, dtype, codec) for c in chunks],
+            frame_shape=frame_shape,
+            dtype=dtype,
+        )
+
+    # copy-on-write, the pages are only copied if modified
+    raw = np.memmap(filename, dtype=np.uint8, mode="c")
+
+    parts = [
+        raw[c["offset"] : c["offset"] + c["nbytes"]]
+        .view(dtype)
+        .reshape((c["n_frames"],) + frame_shape)
+        for c in chunks
+    ]
+
+    if len(parts) == 1:
+        return parts[0]
+    else:
+        return ChunkedArray(parts)
+
+
+class ChunkedArray(object):
+    """
+    A read-only array made of consecutive chunks along the first axis
+
+    Only the chunks touched by an indexing operation are accessed. When the
+    chunks are memory mapped, the content of the file is thus only read
+    where needed. Indexing returns a regular `numpy.ndarray`.
+
+    Parameters
+    ----------
+    chunks: list of array_like
+        The chunks, they should all have the same shape except
+        for the first dimension
+    frame_shape: tuple of int, optional
+        The shape of one element along the first dimension (default to
+        the shape of the first chunk)
+    dtype: numpy.dtype, optional
+        The data type (default to the type of the first chunk)
+    """
+
+    def __init__(self, chunks, frame_shape=None, dtype=None):
+        self.chunks = chunks
+
+        if frame_shape is None:
+            frame_shape = chunks[0].shape[1:]
+        if dtype is None:
+            dtype = chunks[0].dtype
+
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+
+        # index of the first frame of every chunk
+        self.bounds = np.cumsum([0] + [len(c) for c in self.chunks])
+
+    @property
+    def shape(self):
+        return (int(self.bounds[-1]),) + self.frame_shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = self[:]
+        return data if dtype is None else data.astype(dtype)
+
+    def astype(self, dtype, copy=True):
+        """ The content of the array, with the given type, as a `numpy.ndarray` """
+        return self[:].astype(dtype, copy=False)
+
+    def _locate(self, index):
+        """ The chunk containing a frame and the index in this chunk """
+        k = np.searchsorted(self.bounds, index, side="right") - 1
+        return k, index - self.bounds[k]
+
+    def _runs(self, frames):
+        """ Split a list of frames into runs of frames from the same chunk """
+        ks, local = self._locate(frames)
+        breaks = np.flatnonzero(np.diff(ks)) + 1
+        return [
+            (ks[run[0]], local[run])
+            for run in np.split(np.arange(len(frames)), breaks)
+            if len(run) > 0
+        ]
+
+    def _time_axis(self, rest):
+        """ Position of the first axis in the output of indexing with `rest` """
+        probe = [
+            np.broadcast_to(np.zeros(1, dtype=self.dtype), (n,) + self.frame_shape)[
+                (slice(None),) + rest
+            ].shape
+            for n in [2, 3]
+        ]
+        return [a != b for a, b in zip(*probe)].index(True)
+
+    def __getitem__(self, key):
+
+        if not isinstance(key, tuple):
+            key = (key,)
+
+        if len(key) == 0:
+            key = (slice(None),)
+
+        if key[0] is Ellipsis:
+            key = (slice(None),) + key
+
+        index, rest = key[0], key[1:]
+
+        if isinstance(index, (int, np.integer)):
+            if index < -len(self) or index >= len(self):
+                raise IndexError(
+                    "index {} is out of bounds for axis 0 with size {}".format(
+                        index, len(self)
+                    )
+                )
+            k, i = self._locate(index % len(self))
+            return np.asarray(self.chunks[k][(i,) + rest])
+
+        elif isinstance(index, slice):
+            frames = np.arange(*index.indices(len(self)))
+            step = index.indices(len(self))[2]
+
+            # the frames in each chunk are read with a slice
+            pieces = []
+            for k, local in self._runs(frames):
+                end = local[-1] + (1 if step > 0 else -1)
+                local = slice(local[0], end if end >= 0 else None, step)
+                pieces.append(np.asarray(self.chunks[k][(local,) + rest]))
+
+            if len(pieces) == 0:
+                return np.zeros((0,) + self.frame_shape, dtype=self.dtype)[
+                    (slice(None),) + rest
+                ]
+
+            return np.concatenate(pieces, axis=self._time_axis(rest))
+
+        elif index is not None:
+            index = np.asarray(index)
+            if index.dtype == bool:
+                index = np.nonzero(index)[0]
+            index = np.where(index < 0, index + len(self), index)
+
+            if np.any(index < 0) or np.any(index >= len(self)):
+                raise IndexError("index out of bounds for axis 0")
+
+            flat = index.ravel()
+            frames = [np.asarray(self.chunks[k][local]) for k, local in self._runs(flat)]
+            if len(frames) > 0:
+                frames = np.concatenate(frames, axis=0)
+            else:
+                frames = np.zeros((0,) + self.frame_shape, dtype=self.dtype)
+
+            return frames[(np.arange(len(flat)).reshape(index.shape),) + rest]
+
+        else:
+            raise IndexError("Unsupported index {}".format(index))
+
+
 class BlinkyFile(object):
-    def __init__(self, locations, data, fps, version=None, creation=None, **metadata):
+    def __init__(
+        self,
+        locations,
+        data,
+        fps,
+        version=None,
+        creation=None,
+        timestamps=None,
+        track=None,
+        **metadata
+    ):
         self.locations = locations
         self.data = data
 
@@ -92,17 +977,453 @@ class BlinkyFile(object):
         )
         self.metadata = metadata
 
-    def dump(self, filename):
-        """ Saves the object as a MessagePack file """
-        with open(filename, "wb") as f:
-            msgpack.pack(self.__dict__, f, default=encoder, use_bin_type=True)
+        # the timestamps of the frames, with the columns in `video.TIMESTAMP_FIELDS`
+        self.timestamps = timestamps
+
+        # the positions of the boxes when they follow the Blinkies (`processors.BoxTracker`),
+        # a dict with the frames where the positions change, shape `(n_updates,)`, and
+        # the positions `(col, row)` from these frames, shape `(n_updates, n_blinkies, 2)`
+        self.track = track
+
+    def positions(self, frames=None):
+        """
+        The positions of the boxes in the frames
+
+        Parameters
+        ----------
+        frames: array_like, optional
+            The frames (default to all)
+
+        Returns
+        -------
+        numpy.ndarray
+            The positions `(col, row)` of the boxes, with
+            shape `(n_frames, n_blinkies, 2)`
+        """
+        if frames is None:
+            frames = np.arange(self.data.shape[0])
+        frames = np.asarray(frames)
+
+        # the frames before the first update are at the recorded locations
+        locations = np.array(self.locations, dtype=np.float32).reshape((1, -1, 2))
+        if self.track is None or len(self.track["frames"]) == 0:
+            return np.broadcast_to(locations, frames.shape + locations.shape[1:]).copy()
+
+        track = np.concatenate([locations, self.track["positions"]], axis=0)
+        update = np.searchsorted(self.track["frames"], frames, side="right")
+        return track[update]
+
+    def dump(self, filename, chunk_size=None, codec=None):
+        """
+        Saves the object as a MessagePack file
+
+        Parameters
+        ----------
+        filename: str
+            The name of the file
+        chunk_size: int, optional
+            If provided, the file is saved in the chunked format
+            with `chunk_size` frames per chunk
+        codec: str, optional
+            If provided, the file is saved in the chunked format and the
+            chunks are compressed with this codec, one of `CODECS`
+        """
+        if chunk_size is None and codec is not None:
+            chunk_size = DEFAULT_CHUNK_SIZE
+
+        if chunk_size is None:
+            content = dict(self.__dict__)
+            for key in ["timestamps", "track"]:
+                if content[key] is None:
+                    content.pop(key)
+
+            with open(filename, "wb") as f:
+                _pack(content, f)
+
+        else:
+            with BlinkyFileWriter(
+                filename,
+                self.locations,
+                self.fps,
+                chunk_size=chunk_size,
+                codec=codec,
+                version=self.version,
+                creation=self.creation,
+                **self.metadata
+            ) as writer:
+                writer.track = self.track
+
+                # the data is written one chunk at a time, in case it is
+                # memory mapped or read lazily (at least once for the header)
+                for start in range(0, max(len(self.data), 1), chunk_size):
+                    end = start + chunk_size
+                    writer.write(
+                        np.asarray(self.data[start:end]),
+                        timestamps=None
+                        if self.timestamps is None
+                        else self.timestamps[start:end],
+                    )
+
+    @classmethod
+    def info(cls, filename):
+        """
+        Read the attributes of a file without reading the data
+
+        Parameters
+        ----------
+        filename: str
+            The name of the file
+
+        Returns
+        -------
+        dict
+            The attributes of the file (locations, fps, version, creation,
+            metadata), and the shape, dtype and codec of the data
+        """
+        header, chunks = _read_layout(filename)
+
+        n_frames = sum([c["n_frames"] for c in chunks])
+        header["shape"] = (n_frames,) + header.pop("frame_shape")
+
+        return header
 
     @classmethod
-    def load(cls, filename):
-        """ Load a BlinkyFile object from MessagePack format """
-        with open(filename, "rb") as f:
-            content = msgpack.unpack(f, object_hook=decoder, raw=False)
-        return cls(**content)
+    def load(cls, filename, mmap=False, start=None, stop=None, pixels=None):
+        """
+        Load a BlinkyFile object from MessagePack format
+
+        Parameters
+        ----------
+        filename: str
+            The name of the file
+        mmap: bool, optional
+            If True, the data is not read, but memory mapped instead. Only the
+            parts of the file used are then read from disk. The data can be
+            modified, but the changes are not written to the file.
+        start: int, optional
+            The first frame to read
+        stop: int, optional
+            The frame where to stop reading (not included)
+        pixels: list of int or tuples, optional
+            The signals to read, either as their index in the file or as their
+            location in the image
+        """
+        header, chunks = _read_layout(filename)
+
+        layout = (
+            filename,
+            chunks,
+            header.pop("frame_shape"),
+            header.pop("dtype"),
+            header.pop("codec"),
+        )
+
+        if start is None and stop is None and pixels is None:
+            if mmap:
+                data = _map_data(*layout)
+            else:
+                data = _read_data(*layout)
+
+        else:
+            # only the requested part of the memory mapped file is read
+            data = _map_data(*layout)
+
+            if pixels is None:
+                index = None
+                data = data[start:stop]
+            else:
+                index = _pixel_index(header["locations"], pixels)
+                data = data[start:stop, index]
+                header["locations"] = [header["locations"][i] for i in index]
+
+            if header.get("track") is not None:
+                n_frames = sum([c["n_frames"] for c in chunks])
+                header["track"] = _slice_track(
+                    header["track"], *slice(start, stop).indices(n_frames)[:2], index
+                )
+
+            if not mmap and isinstance(data, np.memmap):
+                data = np.array(data)
+
+        timestamps = _read_timestamps(filename, chunks, start=start, stop=stop)
+
+        metadata = header.pop("metadata", {})
+        return cls(data=data, timestamps=timestamps, **header, **metadata)
+
+
+def _slice_track(track, start, stop, index=None):
+    """
+    The track of the boxes between frames `start` and `stop`, and only
+    for the boxes in `index` if provided
+    """
+    frames = np.asarray(track["frames"])
+    positions = np.asarray(track["positions"])
+
+    # the update in effect at `start` is kept and moved to the first frame
+    first = max(np.searchsorted(frames, start, side="right") - 1, 0)
+    last = np.searchsorted(frames, stop, side="left")
+    frames = np.maximum(frames[first:last] - start, 0)
+    positions = positions[first:last]
+
+    if index is not None:
+        positions = positions[:, index]
+
+    return {"frames": frames, "positions": positions}
+
+
+def _pixel_index(locations, pixels):
+    """ Find the index of pixels given by their index or location in the file """
+    locations = [tuple(loc) for loc in locations]
+
+    index = []
+    for p in pixels:
+        if isinstance(p, (int, np.integer)):
+            if p < -len(locations) or p >= len(locations):
+                raise ValueError("There are only {} pixels in the file".format(len(locations)))
+            index.append(p % len(locations))
+        elif tuple(p) in locations:
+            index.append(locations.index(tuple(p)))
+        else:
+            raise ValueError("The pixel {} is not in the file".format(pixel_to_str(p)))
+
+    return index
+
+
+class _DatasetPart(object):
+    """ One of the files of a dataset, opened only when indexed """
+
+    def __init__(self, dataset, index):
+        self.dataset = dataset
+        self.index = index
+
+    def __len__(self):
+        return self.dataset.lengths[self.index]
+
+    def __getitem__(self, key):
+        return self.dataset._open(self.index)[key]
+
+
+class BlinkyDataset(object):
+    """
+    A sequence of Blinky files presented as a single recording
+
+    The files are only opened, memory mapped, when their frames are accessed
+    and a few of them are kept open. The data is indexed with global frame
+    indices, e.g., `dataset.data[t0:t1]` reads only the files covering
+    frames `t0` to `t1`.
+
+    Parameters
+    ----------
+    filenames: list of str
+        The files, in chronological order. They should all have the same
+        locations, shape, and data type.
+    max_open: int, optional
+        The maximum number of files kept open at the same time
+
+    Attributes
+    ----------
+    data: ChunkedArray (n_frames, n_pixels, ...)
+        The concatenated data of all the files
+    locations: list of tuples
+        The location of the pixels recorded
+    fps: float
+        The framerate of the first file
+    infos: list of dict
+        The attributes of all the files, as returned by `BlinkyFile.info`
+    lengths: list of int
+        The number of frames in each file
+    """
+
+    def __init__(self, filenames, max_open=8):
+
+        if len(filenames) == 0:
+            raise ValueError("The dataset should contain at least one file")
+
+        self.filenames = list(filenames)
+        self.max_open = max_open
+        self.infos = [BlinkyFile.info(fn) for fn in self.filenames]
+
+        first = self.infos[0]
+        for fn, info in zip(self.filenames, self.infos):
+            if [tuple(loc) for loc in info["locations"]] != [
+                tuple(loc) for loc in first["locations"]
+            ]:
+                raise ValueError("The locations in {} do not match".format(fn))
+            if info["shape"][1:] != first["shape"][1:] or info["dtype"] != first["dtype"]:
+                raise ValueError("The shape or type of the data in {} do not match".format(fn))
+
+        self.locations = first["locations"]
+        self.fps = first["fps"]
+        self.lengths = [info["shape"][0] for info in self.infos]
+
+        # least recently used files are closed first
+        self._opened = OrderedDict()
+
+        self.data = ChunkedArray(
+            [_DatasetPart(self, i) for i in range(len(self.filenames))],
+            frame_shape=first["shape"][1:],
+            dtype=first["dtype"],
+        )
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def locate(self, frame):
+        """ The index of the file containing a frame and the frame index in this file """
+        if frame < 0 or frame >= len(self):
+            raise IndexError("Frame {} is out of the dataset".format(frame))
+        k, i = self.data._locate(frame)
+        return int(k), int(i)
+
+    def _open(self, index):
+        """ Memory map the data of a file, keeping only the recently used files open """
+        if index in self._opened:
+            self._opened.move_to_end(index)
+        else:
+            self._opened[index] = BlinkyFile.load(self.filenames[index], mmap=True).data
+            while len(self._opened) > self.max_open:
+                self._opened.popitem(last=False)
+
+        return self._opened[index]
+
+
+def reduce_boxes(data, keep_colors=False):
+    """
+    Average the boxes of pixels around the Blinkies, and optionally the colors
+
+    Parameters
+    ----------
+    data: array_like (n_frames, n_pixels[, box_height, box_width][, n_colors])
+        The Blinky signals
+    keep_colors: bool, optional
+        If True, the color channels are not averaged
+
+    Returns
+    -------
+    numpy.ndarray (n_frames, n_pixels[, n_colors])
+        The reduced signals
+    """
+    data = np.asarray(data)
+
+    if data.ndim >= 4:
+        data = np.mean(data, axis=(2, 3), dtype=np.float32)
+
+    if data.ndim == 3 and not keep_colors:
+        data = np.mean(data, axis=2, dtype=np.float32)
+
+    return data.astype(np.float32, copy=False)
+
+
+def export(bfile, output, fmt=None, keep_colors=False, block_size=DEFAULT_CHUNK_SIZE):
+    """
+    Export the signals averaged over the boxes in a layout suitable to read
+    one Blinky at a time
+
+    The signals are read and written by blocks of frames, so that the
+    whole file never needs to be in memory.
+
+    Two formats are available
+
+    * `npy`: the output is a directory containing one `.npy` file per Blinky
+      with shape `(n_frames,)` or `(n_frames, n_colors)` and an `info.json`
+      file with the attributes of the recording, and the timestamps of the
+      frames in `timestamps.npy` if available
+    * `hdf5`: the output is an HDF5 file with the signals in a dataset
+      `signals` of shape `(n_frames, n_blinkies[, n_colors])`, chunked
+      along time so that one Blinky can be read efficiently, and the
+      attributes of the recording. This requires the `h5py` package.
+
+    Parameters
+    ----------
+    bfile: BlinkyFile or str
+        The Blinky file object or the name of the file
+    output: str
+        The name of the output directory or file
+    fmt: str, optional
+        The format, `npy` or `hdf5` (default to `hdf5` when the output
+        name ends with `.h5` or `.hdf5`, and `npy` otherwise)
+    keep_colors: bool, optional
+        If True, the color channels are not averaged
+    block_size: int, optional
+        The number of frames processed at once
+    """
+    if not isinstance(bfile, BlinkyFile):
+        bfile = BlinkyFile.load(bfile, mmap=True)
+
+    if fmt is None:
+        fmt = "hdf5" if output.endswith((".h5", ".hdf5")) else "npy"
+
+    n_frames, n_pixels = bfile.data.shape[:2]
+    signal_shape = reduce_boxes(bfile.data[:1], keep_colors=keep_colors).shape[2:]
+
+    info = {
+        "locations": [list(loc) for loc in bfile.locations],
+        "fps": bfile.fps,
+        "version": bfile.version,
+        "creation": bfile.creation,
+        "metadata": bfile.metadata,
+        "shape": (n_frames, n_pixels) + signal_shape,
+    }
+
+    if fmt == "npy":
+        os.makedirs(output, exist_ok=True)
+
+        info["files"] = ["channel_{:03d}.npy".format(p) for p in range(n_pixels)]
+        with open(os.path.join(output, "info.json"), "w") as f:
+            json.dump(info, f, indent=2, default=str)
+
+        channels = [
+            np.lib.format.open_memmap(
+                os.path.join(output, fn),
+                mode="w+",
+                dtype=np.float32,
+                shape=(n_frames,) + signal_shape,
+            )
+            for fn in info["files"]
+        ]
+
+        for start in range(0, n_frames, block_size):
+            block = reduce_boxes(bfile.data[start : start + block_size], keep_colors)
+            for p, channel in enumerate(channels):
+                channel[start : start + block.shape[0]] = block[:, p]
+
+        for channel in channels:
+            channel.flush()
+
+        if bfile.timestamps is not None:
+            np.save(os.path.join(output, "timestamps.npy"), bfile.timestamps)
+
+    elif fmt == "hdf5":
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("The h5py package is needed to export to HDF5")
+
+        with h5py.File(output, "w") as f:
+            signals = f.create_dataset(
+                "signals",
+                shape=info["shape"],
+                dtype=np.float32,
+                chunks=(max(1, min(n_frames, 4096)), 1) + signal_shape,
+            )
+            f.create_dataset("locations", data=np.array(bfile.locations))
+            if bfile.timestamps is not None:
+                f.create_dataset("timestamps", data=bfile.timestamps)
+
+            for key in ["fps", "version", "creation"]:
+                signals.attrs[key] = info[key]
+            signals.attrs["metadata"] = json.dumps(bfile.metadata, default=str)
+
+            for start in range(0, n_frames, block_size):
+                block = reduce_boxes(bfile.data[start : start + block_size], keep_colors)
+                signals[start : start + block.shape[0]] = block
+
+    else:
+        raise ValueError("Unknown export format {}".format(fmt))
 
 
 def file_preview():
@@ -117,14 +1438,10 @@ def file_preview():
     args = parser.parse_args()
 
     bfile = BlinkyFile.load(args.filename)
-    data = bfile.data.astype(np.float)
-
-    if len(data.shape) == 5:
-        ## This is a color file, we will average the colors
-        data = np.mean(data, axis=-1)
 
-    # Now, for the purpose of preview, we average the boxes
-    data = np.mean(data, axis=(-2, -1))
+    # for the purpose of preview, we average the boxes (unless the file
+    # is already reduced) and the colors
+    data = reduce_boxes(bfile.data)
 
     # Make the time axis
     time = np.arange(data.shape[0]) / bfile.fps
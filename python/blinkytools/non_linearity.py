@@ -17,6 +17,8 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
+import functools
+
 import numpy as np
 
 blinky_min_db = -80.
@@ -43,100 +45,377 @@ blinky_lut = np.array(
 )
 
 
-def clip(x, lo=0.0, hi=1.0):
+# Number of samples processed at once, the block and the temporary
+# arrays needed to process it should fit in the cache
+BLOCK_SIZE = 2 ** 14
+
+
+def _as_float(x):
+    """ Single and double precision arrays are kept, other types converted to double """
+    x = np.asarray(x)
+    if x.dtype in [np.float32, np.float64]:
+        return x
+    else:
+        return x.astype(np.float64)
+
+
+def _blockwise(func, x, out=None, block_size=BLOCK_SIZE, dtype=None):
+    """
+    Apply an in-place function to an array by blocks of samples
+
+    Parameters
+    ----------
+    func: callable
+        A function `func(x_block, out_block)` writing its result in `out_block`
+    x: array_like
+        The input array
+    out: numpy.ndarray, optional
+        C-contiguous array of floating point type where to put the result,
+        it can be `x` itself
+    block_size: int, optional
+        The number of samples processed at once
+    dtype: numpy.dtype, optional
+        The type of the output when `out` is not provided, the input is then
+        used as is (by default, the input is converted to floating point and
+        the output has the same type)
+    """
+    if dtype is None:
+        x = _as_float(x)
+        dtype = x.dtype
+    else:
+        x = np.asarray(x)
+
+    if out is None:
+        out = np.empty(x.shape, dtype=dtype)
+    elif out.shape != x.shape:
+        raise ValueError("The output should have the same shape as the input")
+    elif not out.flags.c_contiguous or out.dtype.kind != "f":
+        raise ValueError("The output should be a C-contiguous floating point array")
+
+    x_flat = x.reshape(-1)
+    out_flat = out.reshape(-1)
+
+    for start in range(0, x_flat.shape[0], block_size):
+        func(x_flat[start : start + block_size], out_flat[start : start + block_size])
+
+    return out
 
-    y = x.copy()
 
-    y[y > hi] = hi
-    y[y < lo] = lo
+def clip(x, lo=0.0, hi=1.0, out=None):
+    """ Clip the values of an array to [lo, hi], the result can be put in `x` itself """
+    return np.clip(x, lo, hi, out=out)
 
+
+def decibels(x, out=None):
+    y = np.log10(x, out=out)
+    y *= 10.0
     return y
 
 
-def decibels(x):
-    return 10. * np.log10(x)
+def decibels_inv(y, out=None):
+    x = np.divide(y, 10.0, out=out)
+    return np.power(x.dtype.type(10.0), x, out=x)
 
-def decibels_inv(y):
-    return 10. ** (y / 10.)
 
+def map_to_unit_interval(x, lo=0.0, hi=1.0, out=None):
+    """ Linearly map value in [lo_val, hi_val] to [0, 1] """
+    y = np.subtract(x, lo, out=out)
+    y /= hi - lo
+    return y
 
-def map_to_unit_interval(x, lo=0., hi=1.):
-  """ Linearly map value in [lo_val, hi_val] to [0, 1] """
-  return (x - lo) / (hi - lo)
 
-def unmap_from_unit_interval(y, lo=0., hi=1.):
-  """ Linearly map value in [0, 1] to [lo_val, hi_val] """
-  return y * (hi - lo) + lo
+def unmap_from_unit_interval(y, lo=0.0, hi=1.0, out=None):
+    """ Linearly map value in [0, 1] to [lo_val, hi_val] """
+    x = np.multiply(y, hi - lo, out=out)
+    x += lo
+    return x
 
 
-def lut_interp(x, lut):
+def lut_interp(x, lut, out=None):
+    """
+    Linear interpolation in a LUT of values evenly spaced on [0, 1]
 
-    x = clip(x, lo=0.0, hi=1.0)
-    y = x.copy()
+    Parameters
+    ----------
+    x: numpy.ndarray
+        Array of values in [0, 1], other values are clipped
+    lut: numpy.ndarray
+        The look-up table
+    out: numpy.ndarray, optional
+        Array where to put the result, it can be `x` itself
+    """
+    y = clip(_as_float(x), lo=0.0, hi=1.0, out=out)
 
-    # bin clipped at 1 should be left alone
-    not_1 = y != 1
+    # repeat the last entry so that 1 falls in the last (flat) bin
+    lut = np.append(lut, lut[-1]).astype(y.dtype)
+    slopes = np.diff(lut)
 
     # linear interpolation between bins
-    p_f = x[not_1] * (len(lut) - 1)
-    p = np.floor(p_f).astype(np.int)
-    y[not_1] = (p_f - p) * (lut[p + 1] - lut[p]) + lut[p]
+    p_f = y * (len(lut) - 2)
+    p = p_f.astype(np.intp)
+    p_f -= p
+
+    np.multiply(p_f, slopes[p], out=y)
+    y += lut[p]
 
     return y
 
 
-def lut_interp_inv(y, lut):
+def lut_interp_inv(y, lut, out=None):
+    """
+    Inverse of the linear interpolation in a monotonically increasing LUT
 
-    y = clip(y, lo=0.0, hi=lut[-1])
+    Parameters
+    ----------
+    y: numpy.ndarray
+        Array of values in [0, lut[-1]], other values are clipped
+    lut: numpy.ndarray
+        The monotonically increasing look-up table
+    out: numpy.ndarray, optional
+        Array where to put the result, it can be `y` itself
+
+    Returns
+    -------
+    numpy.ndarray
+        Array with the same shape as `y` with values in [0, lut[-1]]
+    """
 
-    x = np.linspace(0, lut[-1], len(lut))
+    x = clip(_as_float(y), lo=0.0, hi=lut[-1], out=out)
 
-    y2 = y.flatten()
-    output = np.zeros(y2.shape)
+    lut = lut.astype(x.dtype)
+    lut_x = np.linspace(0, lut[-1], len(lut), dtype=x.dtype)
+    slopes = np.diff(lut) / np.diff(lut_x)
 
-    for i in range(y2.shape[0]):
-        k = np.where(y2[i] - lut[:-1] >= 0)[0][-1]
+    # index of the last bin with lower end smaller than y
+    k = np.searchsorted(lut[:-1], x, side="right") - 1
 
-        a = (lut[k + 1] - lut[k]) / (x[k + 1] - x[k])
-        b = lut[k]
+    x -= lut[k]
+    x /= slopes[k]
+    x += lut_x[k]
 
-        output[i] = (y2[i] - b) / a + x[k]
+    return x
+
+
+def _non_linearity(x, out, lut):
+    decibels(x, out=out)
+    clip(out, lo=blinky_min_db, hi=blinky_max_db, out=out)
+    map_to_unit_interval(out, lo=blinky_min_db, hi=blinky_max_db, out=out)
+    lut_interp(out, lut, out=out)
 
-    return output.reshape(y.shape)
 
+def _non_linearity_inv(y, out, lut):
+    lut_interp_inv(y, lut, out=out)
+    unmap_from_unit_interval(out, lo=blinky_min_db, hi=blinky_max_db, out=out)
+    decibels_inv(out, out=out)
 
-def blinky_non_linearity(x):
+
+def blinky_non_linearity(x, out=None, block_size=BLOCK_SIZE, lut=None):
     """
     Non-linear function used in the Blinky
 
+    The array is processed by blocks that fit in the cache, so that the
+    memory is only read and written once. Single precision input gives
+    single precision output.
+
     Parameters
     ----------
     x: numpy.ndarray
         Array of values of signal power
+    out: numpy.ndarray, optional
+        C-contiguous floating point array where to put the result,
+        it can be `x` itself
+    block_size: int, optional
+        The number of samples processed at once
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`)
     """
-    global blinky_lut
+    if lut is None:
+        lut = blinky_lut
 
-    x = decibels(x)
-    x = clip(x, lo=blinky_min_db, hi=blinky_max_db)
-    x = map_to_unit_interval(x, lo=blinky_min_db, hi=blinky_max_db)
-    x = lut_interp(x, blinky_lut)
-
-    return x
+    func = functools.partial(_non_linearity, lut=lut)
+    return _blockwise(func, x, out=out, block_size=block_size)
 
 
-def blinky_non_linearity_inv(y):
+def blinky_non_linearity_inv(y, out=None, block_size=BLOCK_SIZE, lut=None):
     """
     Inverse of the non-linear function used in Blinky
 
+    The array is processed by blocks that fit in the cache, so that the
+    memory is only read and written once. Single precision input gives
+    single precision output.
+
     Parameters
     ----------
     y: numpy.ndarray
         Array of values
+    out: numpy.ndarray, optional
+        C-contiguous floating point array where to put the result,
+        it can be `y` itself
+    block_size: int, optional
+        The number of samples processed at once
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`),
+        e.g., a per-device table obtained with `blinkytools.calibration`
     """
-    global blinky_lut
+    if lut is None:
+        lut = blinky_lut
 
-    y = lut_interp_inv(y, blinky_lut)
-    y = unmap_from_unit_interval(y, lo=blinky_min_db, hi=blinky_max_db)
-    y = decibels_inv(y)
+    func = functools.partial(_non_linearity_inv, lut=lut)
+    return _blockwise(func, y, out=out, block_size=block_size)
 
-    return y
+
+# Number of entries of the dense table used for floating point input
+DENSE_LUT_SIZE = 4096
+
+# Cache of the dense tables, they are built only once per LUT
+_dense_tables = {}
+
+
+def _cached_table(key, build):
+    if key not in _dense_tables:
+        _dense_tables[key] = build()
+    return _dense_tables[key]
+
+
+def dense_lut(lut=None, size=DENSE_LUT_SIZE, dtype=np.float64):
+    """
+    Dense table of the Blinky non-linearity
+
+    Parameters
+    ----------
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`)
+    size: int, optional
+        The number of entries of the table
+    dtype: numpy.dtype, optional
+        The type of the entries
+
+    Returns
+    -------
+    numpy.ndarray (size,)
+        The output of the non-linearity for `size` values of the power in
+        decibels evenly spaced between `blinky_min_db` and `blinky_max_db`
+    """
+    lut = blinky_lut if lut is None else np.asarray(lut)
+
+    def build():
+        return lut_interp(np.linspace(0.0, 1.0, size), lut).astype(dtype)
+
+    key = ("forward", lut.tobytes(), size, np.dtype(dtype).str, blinky_min_db, blinky_max_db)
+    return _cached_table(key, build)
+
+
+def dense_lut_inv(lut=None, max_value=255, dtype=np.float64):
+    """
+    Dense table of the inverse of the Blinky non-linearity for integer input
+
+    Parameters
+    ----------
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`)
+    max_value: int, optional
+        The integer value corresponding to the maximum of the non-linearity
+    dtype: numpy.dtype, optional
+        The type of the entries
+
+    Returns
+    -------
+    numpy.ndarray (max_value + 1,)
+        The signal power for every integer value from 0 to `max_value`
+    """
+    lut = blinky_lut if lut is None else np.asarray(lut)
+
+    def build():
+        y = np.arange(max_value + 1) / max_value
+        y = lut_interp_inv(y, lut)
+        y = unmap_from_unit_interval(y, lo=blinky_min_db, hi=blinky_max_db)
+        return decibels_inv(y).astype(dtype)
+
+    key = ("inverse", lut.tobytes(), max_value, np.dtype(dtype).str, blinky_min_db, blinky_max_db)
+    return _cached_table(key, build)
+
+
+def _non_linearity_dense(x, out, table):
+    # compute the index in the table in place
+    out = np.log10(x, out=out)
+    out *= 10.0
+    out -= blinky_min_db
+    out *= (len(table) - 1) / (blinky_max_db - blinky_min_db)
+    np.clip(out, 0, len(table) - 1, out=out)
+    np.rint(out, out=out)
+
+    # only the indices of one block are allocated
+    np.take(table, out.astype(np.intp), out=out)
+
+
+def _non_linearity_inv_dense(y, out, table):
+    np.take(table, y, out=out, mode="clip")
+
+
+def blinky_non_linearity_dense(
+    x, out=None, size=DENSE_LUT_SIZE, block_size=BLOCK_SIZE, lut=None
+):
+    """
+    Fast approximation of `blinky_non_linearity` with a dense table
+
+    The output is the entry of the table closest to the input, which is
+    within 3e-4 of the exact value for the default table size.
+
+    Parameters
+    ----------
+    x: numpy.ndarray
+        Array of values of signal power
+    out: numpy.ndarray, optional
+        C-contiguous floating point array where to put the result, no memory
+        is allocated for the output if provided
+    size: int, optional
+        The number of entries of the table
+    block_size: int, optional
+        The number of samples processed at once
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`),
+        the dense table is built once per look-up table
+    """
+    x = _as_float(x)
+    table = dense_lut(lut=lut, size=size, dtype=x.dtype if out is None else out.dtype)
+
+    func = functools.partial(_non_linearity_dense, table=table)
+    return _blockwise(func, x, out=out, block_size=block_size)
+
+
+def blinky_non_linearity_inv_dense(
+    y, max_value=None, out=None, block_size=BLOCK_SIZE, lut=None
+):
+    """
+    Inverse of the Blinky non-linearity for integer pixel values with a
+    dense table, the output is the same as `blinky_non_linearity_inv(y / max_value)`
+
+    Parameters
+    ----------
+    y: numpy.ndarray of uint8 or uint16
+        Array of pixel values
+    max_value: int, optional
+        The pixel value corresponding to the maximum of the non-linearity
+        (default to the largest value of the integer type)
+    out: numpy.ndarray, optional
+        C-contiguous floating point array where to put the result, no memory
+        is allocated for the output if provided
+    block_size: int, optional
+        The number of samples processed at once
+    lut: numpy.ndarray, optional
+        The look-up table of the non-linearity (default to `blinky_lut`),
+        e.g., a per-device table obtained with `blinkytools.calibration`
+    """
+    y = np.asarray(y)
+
+    if y.dtype not in [np.uint8, np.uint16]:
+        raise TypeError("The input should be of type uint8 or uint16")
+
+    if max_value is None:
+        max_value = np.iinfo(y.dtype).max
+
+    dtype = np.float64 if out is None else out.dtype
+    table = dense_lut_inv(lut=lut, max_value=max_value, dtype=dtype)
+
+    func = functools.partial(_non_linearity_inv_dense, table=table)
+    return _blockwise(func, y, out=out, block_size=block_size, dtype=dtype)
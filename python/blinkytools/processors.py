@@ -21,11 +21,18 @@ class ProcessorBase(abc.ABC):
     """
     Base class for online processing objects
 
-    The derived classes should implement the __process__ method.
+    The derived classes should implement the __process__ method, and can
+    implement the __process_batch__ method to process stacks of frames at once.
+
+    The frames are processed asynchronously. When they are views in the pool
+    of a video stream (`ring_buffer=True`), the `release` method of the stream
+    should be provided, it is called with the frames once they are processed,
+    or dropped.
     """
 
-    def __init__(self, monitor=False, qlen=10):
+    def __init__(self, monitor=False, qlen=10, release=None):
         self.monitor = monitor
+        self.release = release
 
         self.deltas = deque([], qlen)  # list of time delta between two batch of frames
         self.avg_fps = 0.0
@@ -54,13 +61,47 @@ class ProcessorBase(abc.ABC):
         # wait for processing loop to terminate
         self._thread.join()
 
+        # give back the frames that were not processed
+        while not self.queue.empty():
+            frames, _, _ = self.queue.get_nowait()
+            self._release(frames)
+
         # do the final processing
         self.__finalize__()
 
-    def process(self, frames):
-        """ Interface to add new frames for processing """
+    def process(self, frames, timestamps=None):
+        """
+        Interface to add new frames for processing
+
+        Parameters
+        ----------
+        frames: array_like (height, width[, n_colors])
+            The frame
+        timestamps: array_like (3,), optional
+            The timestamp of the frame, see `ThreadedVideoStream.read`
+        """
         if self._is_running:
-            self.queue.put(frames)
+            self.queue.put((frames, False, timestamps))
+        else:
+            self._release(frames)
+
+    def process_batch(self, frames, timestamps=None):
+        """
+        Interface to add a stack of frames for processing
+
+        Parameters
+        ----------
+        frames: array_like (n_frames, height, width[, n_colors])
+            The frames, e.g., from `ThreadedVideoStream.read_batch`. The frames
+            are processed in a separate thread and should not be modified
+            until then.
+        timestamps: array_like (n_frames, 3), optional
+            The timestamps of the frames
+        """
+        if self._is_running:
+            self.queue.put((frames, True, timestamps))
+        else:
+            self._release(frames)
 
     def __len__(self):
         return self.queue.qsize()
@@ -93,23 +134,46 @@ class ProcessorBase(abc.ABC):
         """
         pass
 
+    def __process_batch__(self, frames, timestamps=None):
+        """
+        Method called to process a stack of frames, and their timestamps
+        if available. By default the frames are processed one by one and
+        the timestamps are ignored.
+        """
+        for frame in frames:
+            self.__process__(frame)
+
+    def _release(self, frames):
+        """ Give back the frames to the video stream, if needed """
+        if self.release is not None:
+            self.release(frames)
+
     def _process_loop(self):
         """ The processing loop running in a separate thread """
 
         while self._is_running:
 
             try:
-                frames = self.queue.get(block=True, timeout=0.1)
+                frames, is_batch, timestamps = self.queue.get(block=True, timeout=0.1)
             except queue.Empty:
                 continue
 
             # do the work
-            self.__process__(frames)
+            if is_batch:
+                self.__process_batch__(frames, timestamps)
+            elif timestamps is not None:
+                self.__process_batch__(frames[None], np.asarray(timestamps)[None])
+            else:
+                self.__process__(frames)
+
+            self._release(frames)
 
             if self.monitor:
 
                 # now measure the frame rate
-                if frames.ndim <= 3:
+                if is_batch:
+                    n_frames = len(frames[0] if isinstance(frames, list) else frames)
+                elif frames.ndim <= 3:
                     n_frames = 1
                 elif frames.ndim > 3:
                     n_frames = np.prod(frames.shape[:-3])
@@ -147,6 +211,10 @@ class ReadSpeedMonitor(ProcessorBase):
         pass
 
 
+# The largest number of values processed at once by OnlineStats
+_STATS_BLOCK_SIZE = 2 ** 22
+
+
 class OnlineStats(ProcessorBase):
     """
     Compute statistics on the input data in an online way
@@ -155,6 +223,12 @@ class OnlineStats(ProcessorBase):
     ----------
     shape: tuple of int
         Shape of a data point tensor
+    dtype: numpy.dtype, optional
+        The precision of the computations on a new collection of data points,
+        e.g., `numpy.float32` is faster for large images
+    release: callable, optional
+        Called with the frames once processed, e.g., the `release` method of
+        a video stream in ring buffer mode
 
     Attributes
     ----------
@@ -162,20 +236,27 @@ class OnlineStats(ProcessorBase):
         Mean of all input samples
     var: array_like (shape)
         Variance of all input samples
+    min: array_like (shape)
+        Minimum of all input samples
+    max: array_like (shape)
+        Maximum of all input samples
     count: int
         Sample size
     """
 
-    def __init__(self, shape, monitor=False, qlen=10):
+    def __init__(self, shape, monitor=False, qlen=10, dtype=np.float64, release=None):
         """
         Initialize everything to zero
         """
         # call parent method
-        ProcessorBase.__init__(self, monitor=monitor, qlen=qlen)
+        ProcessorBase.__init__(self, monitor=monitor, qlen=qlen, release=release)
 
         self.shape = shape
+        self.dtype = dtype
         self.mean = np.zeros(shape, dtype=np.float64)
         self.var = np.zeros(shape, dtype=np.float64)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
         self.count = 0
 
     def __process__(self, data):
@@ -194,14 +275,30 @@ class OnlineStats(ProcessorBase):
                 "The data.shape[1:] should match the statistics object shape"
             )
 
-        data.reshape((-1,) + self.shape)
+        data = data.reshape((-1,) + self.shape)
 
         count = data.shape[0]
-        mean = np.mean(data, axis=0)
-        var = np.var(data, axis=0)
-
-        m1 = self.var * (self.count - 1)
-        m2 = var * (count - 1)
+        if count == 0:
+            return
+
+        mean = np.mean(data, axis=0, dtype=self.dtype)
+
+        # the squared differences to the mean of the batch are summed over
+        # as many data points at once as fit in `_STATS_BLOCK_SIZE` values,
+        # which is the whole batch for small data points
+        step = max(1, _STATS_BLOCK_SIZE // max(mean.size, 1))
+        m2 = np.zeros(self.shape, dtype=self.dtype)
+        for start in range(0, count, step):
+            diff = np.subtract(data[start : start + step], mean, dtype=self.dtype)
+            np.multiply(diff, diff, out=diff)
+            m2 += np.sum(diff, axis=0)
+
+        np.minimum(self.min, np.minimum.reduce(data, axis=0), out=self.min)
+        np.maximum(self.max, np.maximum.reduce(data, axis=0), out=self.max)
+
+        # merge with the previous batches (Chan et al.'s parallel algorithm),
+        # with the sums of squared differences to the means
+        m1 = self.var * max(self.count - 1, 0)
         M2 = (
             m1
             + m2
@@ -210,7 +307,18 @@ class OnlineStats(ProcessorBase):
 
         self.mean = (count * mean + self.count * self.mean) / (count + self.count)
         self.count += count
-        self.var = M2 / (self.count - 1)
+        self.var = M2 / max(self.count - 1, 1)
+
+    def __finalize__(self):
+        """ The statistics are always up to date """
+        pass
+
+
+# The number of recent timestamps kept by BoxCatcher
+RECENT_TIMESTAMPS = 1000
+
+# The reductions of the boxes available in BoxCatcher
+REDUCTIONS = ["raw", "mean", "max", "gaussian", "channel"]
 
 
 class BoxCatcher(ProcessorBase):
@@ -224,42 +332,500 @@ class BoxCatcher(ProcessorBase):
         The location of the pixels to collect in the image
     box_size: list  or tuple of two int
         The width and height of the bounding box to use for averaging
+    writer: blinkytools.io.BlinkyFileWriter, optional
+        If provided, the frames are written to file as they are collected,
+        rather than kept in memory. The writer is not closed when the
+        processing stops.
+    channel_order: str, optional
+        The order of the channels of the frames ("RGB", "BGR", "GRAY", "RAW"),
+        see `ThreadedVideoStream.channel_order`. The boxes of BGR frames are
+        stored in RGB order.
+    reduce: str, optional
+        How the boxes are reduced before being stored, "raw" (the boxes are
+        kept), "mean", "max", "gaussian" (weighted average, larger at the
+        center of the box), or "channel" (the average of the color channel
+        `channel` only). The colors are kept by "mean", "max", and "gaussian".
+    channel: int, optional
+        The color channel (in RGB order) kept by the "channel" reduction
+    sigma: float, optional
+        The standard deviation of the weights of the "gaussian" reduction, in
+        pixels (default to a quarter of the box size)
+    release: callable, optional
+        Called with the frames once processed, e.g., the `release` method of
+        a video stream in ring buffer mode
+
+    Attributes
+    ----------
+    data: array_like (n_frames, n_pixels[, box_height, box_width][, n_colors])
+        The collected values, only available after the processing stopped
+        and if no writer was provided. The box dimensions are only present
+        with the "raw" reduction.
+    n_frames: int
+        The number of frames collected
+    timestamps: numpy.ndarray (n_frames, 3)
+        The timestamps of the frames, if provided with the frames, only
+        available after the processing stopped and if no writer was provided
+        (they are then stored in the file)
+    recent_timestamps: collections.deque
+        The timestamps of the last `RECENT_TIMESTAMPS` frames, e.g., to
+        estimate the framerate while recording to file
     """
 
-    def __init__(self, pixels, box_size, monitor=False):
+    def __init__(
+        self,
+        pixels,
+        box_size,
+        monitor=False,
+        writer=None,
+        channel_order="RGB",
+        reduce="raw",
+        channel=0,
+        sigma=None,
+        release=None,
+    ):
+
+        if reduce not in REDUCTIONS:
+            raise ValueError(
+                "The reduction should be one of {}".format(", ".join(REDUCTIONS))
+            )
 
         # call parent method
-        ProcessorBase.__init__(self, monitor=monitor)
+        ProcessorBase.__init__(self, monitor=monitor, release=release)
 
         # set the attributes
         self.pixels = pixels
         self.data = []
         self.box_size = box_size
-
-        # precompute the slices for each pixel
-        off_w = self.box_size[0] // 2
-        off_h = self.box_size[1] // 2
-        self.ranges = [
-            [
-                slice(loc[0] - off_w, loc[0] - off_w + self.box_size[0]),  # columns
-                slice(loc[1] - off_h, loc[1] - off_h + self.box_size[1]),  # row
-            ]
-            for loc in self.pixels
+        self.writer = writer
+        self.channel_order = channel_order
+        self.reduce = reduce
+        self.channel = channel
+        self.n_frames = 0
+        self.timestamps = []
+        self.recent_timestamps = deque([], RECENT_TIMESTAMPS)
+
+        # the values of the frames are collected here, and reduced there
+        self._frames = None
+        self._reduced = None
+
+        # the weights of the gaussian reduction
+        if sigma is None:
+            sigma = max(self.box_size) / 4
+        weights = [
+            np.exp(-0.5 * ((np.arange(b) - (b - 1) / 2) / sigma) ** 2)
+            for b in self.box_size
         ]
+        self._weights = np.outer(weights[1], weights[0]).astype(np.float32)
+        self._weights /= np.sum(self._weights)
+
+        # the indices of the boxes in the flattened frames, computed
+        # once the shape of the frames is known
+        self._index = {}
 
     def __process__(self, frames):
+        """
+        Catch the values of the pixels in a frame
+
+        Parameters
+        ----------
+        frames: array_like (height, width[, n_colors])
+            The frame
+        """
+        self.__process_batch__(frames[None])
+
+    def __process_batch__(self, frames, timestamps=None):
         """
         Catch the values of the pixels in a stack of frames
 
         Parameters
         ----------
-        frames: array_like (..., width, height, n_colors)
-            The stack of frames
+        frames: array_like (n_frames, height, width[, n_colors])
+            The frames
+        timestamps: array_like (n_frames, 3), optional
+            The timestamps of the frames
         """
-        self.data.append([frames[r_h, r_w].copy() for r_w, r_h in self.ranges])
+        boxes = self._boxes(frames)
+        self._gather(frames, boxes)
+        self._store(self._reduce(boxes), timestamps)
+
+    def _boxes(self, frames):
+        """ The buffer where to collect the boxes of a stack of frames """
+        n_frames = frames.shape[0]
+
+        if self._frames is None or self._frames.shape[0] < n_frames:
+            self._frames = np.empty(
+                (n_frames,) + self._gather_index(frames.shape[1:]).shape,
+                dtype=frames.dtype,
+            )
+
+        return self._frames[:n_frames]
+
+    def _reduce(self, boxes):
+        """ Reduce the boxes, for all the pixels and frames at once """
+        if self.reduce == "raw":
+            return boxes
+
+        n_frames = boxes.shape[0]
+        shape = boxes.shape[:2] + boxes.shape[4:]
+        dtype = boxes.dtype if self.reduce == "max" else np.float32
+
+        if self._reduced is None or self._reduced.shape[0] < n_frames:
+            self._reduced = np.empty((n_frames,) + shape[1:], dtype=dtype)
+        out = self._reduced[:n_frames]
+
+        if self.reduce == "max":
+            np.max(boxes, axis=(2, 3), out=out)
+        elif self.reduce == "gaussian":
+            np.einsum("fpij...,ij->fp...", boxes, self._weights, out=out)
+        else:
+            np.mean(boxes, axis=(2, 3), dtype=np.float32, out=out)
+
+        return out
+
+    def _gather_index(self, frame_shape, pixels=slice(None)):
+        """
+        The indices of the boxes around a range of the pixels in a flattened
+        frame, with shape (n_pixels, box_height, box_width[, n_colors])
+
+        The boxes overlapping the border of the frame are clipped, i.e., the
+        pixels on the border are repeated. The channels of BGR frames are
+        reversed.
+        """
+        key = (frame_shape, pixels.start, pixels.stop)
+
+        if key not in self._index:
+            height, width = frame_shape[:2]
+            box_w, box_h = self.box_size
+
+            locations = self._locations(pixels)
+            cols = locations[:, 0, None] - box_w // 2 + np.arange(box_w)
+            rows = locations[:, 1, None] - box_h // 2 + np.arange(box_h)
+            cols = np.clip(cols, 0, width - 1)
+            rows = np.clip(rows, 0, height - 1)
+
+            index = rows[:, :, None] * width + cols[:, None, :]
+
+            if len(frame_shape) > 2:
+                channels = np.arange(frame_shape[2])
+                if self.channel_order == "BGR":
+                    # only the boxes are converted to RGB
+                    channels = channels[::-1]
+                if self.reduce == "channel":
+                    # only one channel is collected
+                    index = index * frame_shape[2] + channels[self.channel]
+                else:
+                    index = index[..., None] * frame_shape[2] + channels
+
+            self._index[key] = index
+
+        return self._index[key]
+
+    def _locations(self, pixels=slice(None)):
+        """ The centers of the boxes of a range of the pixels, shape (n_pixels, 2) """
+        return np.array(self.pixels[pixels], dtype=np.intp).reshape((-1, 2))
+
+    def _gather(self, frames, boxes, pixels=slice(None)):
+        """ Collect the boxes around a range of the pixels in a stack of frames """
+        index = self._gather_index(frames.shape[1:], pixels)
+
+        # a single gather for all the boxes of all the frames
+        flat = frames.reshape((frames.shape[0], -1))
+        np.take(flat, index, axis=1, out=boxes, mode="clip")
+
+    def _store(self, boxes, timestamps=None):
+        """ Write the boxes collected to file or keep them in memory """
+        if timestamps is not None:
+            timestamps = np.array(timestamps, dtype=np.float64)
+            self.recent_timestamps.extend(timestamps)
+
+            # with a writer, the memory used does not grow with the recording
+            if self.writer is None:
+                self.timestamps.append(timestamps)
+
+        if self.writer is not None:
+            self.writer.write(boxes, timestamps=timestamps)
+        else:
+            self.data.append(boxes.copy())
+
+        self.n_frames += boxes.shape[0]
 
     def __finalize__(self):
         """
         Consolidate collected data in numpy ndarray with shape (n_frames, n_pixels, box_height, box_width, 
         """
-        self.data = np.array(self.data)
+        if self.writer is not None:
+            self.writer.flush()
+            self.data = None
+        elif len(self.data) > 0:
+            self.data = np.concatenate(self.data, axis=0)
+        else:
+            self.data = np.array(self.data)
+
+        # the timestamps are only kept if all the frames had one
+        n_stamps = sum([len(t) for t in self.timestamps])
+        if n_stamps > 0 and n_stamps == self.n_frames:
+            self.timestamps = np.concatenate(self.timestamps, axis=0)
+        else:
+            self.timestamps = None
+
+
+class MultiBoxCatcher(BoxCatcher):
+    """
+    Collect the values of a few pixels in the synchronized frames of
+    several cameras, e.g., from a `MultiCameraStream`, into a single
+    recording
+
+    The pixels of all the cameras are stored one after the other, the
+    camera of every pixel is given by the `cameras` attribute.
+
+    Parameters
+    ----------
+    pixels: list of list of tuples
+        The location of the pixels to collect in the image, for every camera
+    box_size: list  or tuple of two int
+        The width and height of the bounding box to use for averaging
+    writer: blinkytools.io.BlinkyFileWriter, optional
+        If provided, the frames are written to file as they are collected,
+        the locations of the writer should be `MultiBoxCatcher.flatten(pixels)[0]`.
+        The camera of every pixel is added to its metadata (`cameras`).
+    **kwargs:
+        The options of `BoxCatcher` (channel order, reduction), the same
+        for all the cameras
+
+    Attributes
+    ----------
+    locations: list of tuples
+        The location of the pixels, in the order of the data
+    cameras: list of int
+        The camera of every pixel
+    timestamps: numpy.ndarray (n_frames, n_cameras, 3)
+        The timestamps of the frames of all the cameras, if provided and if
+        no writer was provided
+    """
+
+    def __init__(self, pixels, box_size, monitor=False, writer=None, **kwargs):
+        self.locations, self.cameras = self.flatten(pixels)
+
+        if writer is not None:
+            # the metadata is written with the header, before the first frames
+            if writer.frame_shape is not None:
+                raise ValueError("The writer should not contain frames yet")
+            writer.metadata["cameras"] = self.cameras
+
+        BoxCatcher.__init__(
+            self, self.locations, box_size, monitor=monitor, writer=writer, **kwargs
+        )
+
+        # the range of pixels of every camera
+        bounds = np.cumsum([0] + [len(p) for p in pixels])
+        self.camera_pixels = [slice(b, e) for b, e in zip(bounds[:-1], bounds[1:])]
+
+    @staticmethod
+    def flatten(pixels):
+        """
+        The locations of the pixels of all the cameras in a single list,
+        and the camera of every pixel
+        """
+        locations = [tuple(p) for cam_pixels in pixels for p in cam_pixels]
+        cameras = [c for c, cam_pixels in enumerate(pixels) for p in cam_pixels]
+        return locations, cameras
+
+    def process(self, frames, timestamps=None):
+        """
+        Interface to add a bundle of synchronized frames for processing
+
+        Parameters
+        ----------
+        frames: list of array_like (height, width[, n_colors])
+            The frames of all the cameras
+        timestamps: array_like (n_cameras, 3), optional
+            The timestamps of the frames
+        """
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps)[None]
+        self.process_batch([frame[None] for frame in frames], timestamps=timestamps)
+
+    def __process__(self, frames):
+        self.__process_batch__([frame[None] for frame in frames])
+
+    def __process_batch__(self, frames, timestamps=None):
+        """
+        Catch the values of the pixels in a stack of bundles of frames
+
+        Parameters
+        ----------
+        frames: list of array_like (n_frames, height, width[, n_colors])
+            The frames, for every camera
+        timestamps: array_like (n_frames, n_cameras, 3), optional
+            The timestamps of the frames
+        """
+        boxes = self._boxes(frames[0])
+
+        for stack, pixels in zip(frames, self.camera_pixels):
+            self._gather(stack, boxes[:, pixels], pixels=pixels)
+
+        self._store(self._reduce(boxes), timestamps)
+
+
+class BoxTracker(BoxCatcher):
+    """
+    A BoxCatcher that follows the Blinkies when they move in the image,
+    e.g., because of the drift of the camera
+
+    Every `track_every` frames, the box of every Blinky is moved towards the
+    centroid of the intensity in a search window around its current position.
+    The positions are sub-pixel and the boxes are collected around the
+    closest pixel. The windows of all the Blinkies are collected with a
+    single gather and only every `downsample` pixels.
+
+    Parameters
+    ----------
+    pixels: list of tuples
+        The initial location of the pixels to collect in the image
+    box_size: list  or tuple of two int
+        The width and height of the bounding box to use for averaging
+    track_every: int, optional
+        The number of frames between two updates of the positions
+    search: int, optional
+        The half size of the search window, in pixels (default to the size
+        of the box)
+    downsample: int, optional
+        The step between the pixels of the search window
+    max_shift: float, optional
+        The largest move of a box in one update, in pixels, so that the
+        boxes do not jump to a neighboring Blinky
+    min_contrast: float, optional
+        The positions are only updated when the difference of the brightest
+        pixel and the background of the window (summed over the colors) is
+        at least this, i.e., when the Blinky is lit
+    **kwargs:
+        The options of `BoxCatcher`
+
+    Attributes
+    ----------
+    positions: numpy.ndarray (n_pixels, 2)
+        The current positions `(col, row)` of the boxes
+    track: dict
+        The frames where the positions changed and the positions from these
+        frames, see `BlinkyFile.track`, only available after the processing
+        stopped. It is also stored by the writer, if any.
+    """
+
+    def __init__(
+        self,
+        pixels,
+        box_size,
+        track_every=30,
+        search=None,
+        downsample=1,
+        max_shift=1.0,
+        min_contrast=10.0,
+        **kwargs
+    ):
+        if track_every <= 0 or downsample <= 0:
+            raise ValueError("The tracking period and downsampling should be positive")
+
+        BoxCatcher.__init__(self, pixels, box_size, **kwargs)
+
+        self.track_every = track_every
+        self.search = search if search is not None else max(box_size)
+        self.downsample = downsample
+        self.max_shift = max_shift
+        self.min_contrast = min_contrast
+
+        self.positions = np.array(pixels, dtype=np.float32).reshape((-1, 2))
+        self.track = {"frames": [], "positions": []}
+
+        # the offsets of the samples of the search window
+        self._offsets = np.arange(-self.search, self.search + 1, self.downsample)
+
+    def __process_batch__(self, frames, timestamps=None):
+        """
+        Catch the values of the pixels in a stack of frames, the positions
+        are updated on the frames where they are due
+
+        Parameters
+        ----------
+        frames: array_like (n_frames, height, width[, n_colors])
+            The frames
+        timestamps: array_like (n_frames, 3), optional
+            The timestamps of the frames
+        """
+        start = 0
+        while start < frames.shape[0]:
+            if self.n_frames % self.track_every == 0:
+                self._track(frames[start])
+
+            end = start + self.track_every - self.n_frames % self.track_every
+            BoxCatcher.__process_batch__(
+                self,
+                frames[start:end],
+                None if timestamps is None else timestamps[start:end],
+            )
+            start = end
+
+    def _locations(self, pixels=slice(None)):
+        return np.rint(self.positions[pixels]).astype(np.intp)
+
+    def _track(self, frame):
+        """ Move the boxes to the centroid of the intensity around them in a frame """
+        height, width = frame.shape[:2]
+
+        centers = np.rint(self.positions).astype(np.intp)
+        cols = np.clip(centers[:, 0, None] + self._offsets, 0, width - 1)
+        rows = np.clip(centers[:, 1, None] + self._offsets, 0, height - 1)
+        index = rows[:, :, None] * width + cols[:, None, :]
+
+        # the windows of all the Blinkies, with the colors summed
+        flat = frame.reshape((height * width, -1))
+        windows = np.take(flat, index, axis=0).astype(np.float32)
+        windows = windows @ np.ones(flat.shape[1], dtype=np.float32)
+
+        # only the pixels brighter than half the peak are weighted
+        background = np.mean(windows, axis=(1, 2))
+        peak = np.max(windows, axis=(1, 2))
+        threshold = background + 0.5 * (peak - background)
+        weights = np.maximum(windows - threshold[:, None, None], 0.0)
+
+        mass = np.sum(weights, axis=(1, 2))
+        valid = (peak - background >= self.min_contrast) & (mass > 0)
+        if not np.any(valid):
+            return
+
+        mass = np.where(valid, mass, 1.0)
+        centroid = np.stack(
+            [
+                np.einsum("pij,pj->p", weights, cols.astype(np.float32)) / mass,
+                np.einsum("pij,pi->p", weights, rows.astype(np.float32)) / mass,
+            ],
+            axis=1,
+        )
+
+        shift = centroid - self.positions
+        norm = np.linalg.norm(shift, axis=1)
+        scale = np.minimum(1.0, self.max_shift / np.maximum(norm, 1e-6))
+        shift *= np.where(valid, scale, 0.0)[:, None]
+        if not np.any(shift != 0):
+            return
+
+        old = self._locations()
+        self.positions += shift
+        self.track["frames"].append(self.n_frames)
+        self.track["positions"].append(self.positions.copy())
+
+        # the indices of the boxes are only computed again when they move
+        if np.any(self._locations() != old):
+            self._index = {}
+
+    def __finalize__(self):
+        BoxCatcher.__finalize__(self)
+
+        self.track = {
+            "frames": np.array(self.track["frames"], dtype=np.int64),
+            "positions": np.array(self.track["positions"], dtype=np.float32).reshape(
+                (-1,) + self.positions.shape
+            ),
+        }
+
+        if self.writer is not None:
+            self.writer.track = self.track
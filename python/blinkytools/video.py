@@ -4,9 +4,87 @@ streaming videos and reading frames and pixel locations
 
 Code written by Daiki Horiike and Robin Scheibler, 2018
 """
+import bisect
+import json
+import os
 import cv2
-from threading import Thread
+import numpy as np
+from threading import Thread, current_thread
 import queue
+import time
+
+# What to do with a new frame when the buffer is full
+DROP_POLICIES = ["block", "drop_oldest", "drop_newest"]
+
+# The conversion applied to the frames decoded by opencv (in BGR order)
+# for every color mode, and the resulting channel order
+_COLOR_CONVERSIONS = {
+    "rgb": cv2.COLOR_BGR2RGB,
+    "bgr": None,
+    "gray": cv2.COLOR_BGR2GRAY,
+    "raw": None,
+}
+CHANNEL_ORDERS = {"rgb": "RGB", "bgr": "BGR", "gray": "GRAY", "raw": "RAW"}
+
+# The columns of the timestamps of the frames: the time on the host when the
+# frame was read (monotonic clock, in seconds), the time of the frame reported
+# by the decoder (in milliseconds), and the index of the frame in the video
+TIMESTAMP_FIELDS = ["host_time", "pos_msec", "frame_index"]
+
+# The positions where seeking in a video file was verified to be accurate
+# (typically the keyframes), per file, so that seeking again is fast
+_seek_points = {}
+
+# The positions are also saved next to the video file, so that they are
+# shared by the processes (e.g., the workers of `extract.extract`) and
+# the sessions working on the same file
+SEEK_CACHE_SUFFIX = ".seek.json"
+
+
+def _file_key(filename):
+    """ Identify a file, and its version """
+    st = os.stat(filename)
+    return (os.path.realpath(filename), st.st_mtime_ns, st.st_size)
+
+
+def _read_seek_cache(key):
+    """ The seek positions saved for a file, empty if missing or outdated """
+    try:
+        with open(key[0] + SEEK_CACHE_SUFFIX, "r") as f:
+            content = json.load(f)
+        if [content["mtime_ns"], content["size"]] == list(key[1:]):
+            return [int(p) for p in content["points"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    return []
+
+
+def _get_seek_points(filename):
+    """ The sorted list of the known seek positions of a file """
+    key = _file_key(filename)
+    if key not in _seek_points:
+        _seek_points[key] = sorted(set([0] + _read_seek_cache(key)))
+    return _seek_points[key]
+
+
+def _save_seek_points(filename):
+    """
+    Save the seek positions of a file next to it, merged with the ones
+    saved by other processes, nothing is saved if the directory is read-only
+    """
+    key = _file_key(filename)
+    points = _seek_points.setdefault(key, [0])
+    points[:] = sorted(set(points + _read_seek_cache(key)))
+
+    content = {"mtime_ns": key[1], "size": key[2], "points": points}
+    cache = key[0] + SEEK_CACHE_SUFFIX
+    tmp = "{}.{}.tmp".format(cache, os.getpid())
+    try:
+        with open(tmp, "w") as f:
+            json.dump(content, f)
+        os.replace(tmp, cache)  # atomic, concurrent writers don't mix
+    except OSError:
+        pass
 
 
 class FrameGrabber(object):
@@ -28,15 +106,68 @@ class ThreadedVideoStream(object):
     ----------
     video: int or str
         If an int, this is the index of the video stream. If a str, this is a filename.
+    start: int, optional
+        The first frame to read
+    end: int, optional
+        The frame where to stop reading
+    qmax_len: int, optional
+        The maximum number of frames to buffer
+    drop_policy: str, optional
+        What to do when the buffer is full. With "block", the capture waits
+        for the consumer (appropriate for files), with "drop_oldest" the
+        oldest buffered frame is discarded and with "drop_newest" the new frame
+        is discarded (appropriate for live streams)
+    ring_buffer: bool, optional
+        If True, the frames are decoded in a pool of `qmax_len` preallocated
+        frames. The frames returned by `read` are then views in the pool that
+        must be given back with `release` once processed. The processors
+        work asynchronously, they give the frames back themselves when the
+        method is passed as their `release` argument.
+    color_mode: str, optional
+        The format of the frames, "rgb", "bgr" (the native order of opencv,
+        no conversion), "gray", or "raw" (the data of the camera, without
+        conversion to BGR by the backend, e.g., a single channel). When only
+        a few pixels of the frames are used, "bgr" saves a conversion of the
+        full frame, and the channel order is given by `channel_order`.
     """
 
-    def __init__(self, video, start=0, end=None, qmax_len=200):
+    def __init__(
+        self,
+        video,
+        start=0,
+        end=None,
+        qmax_len=200,
+        drop_policy="block",
+        ring_buffer=False,
+        color_mode="rgb",
+    ):
+
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(
+                "The drop policy should be one of {}".format(", ".join(DROP_POLICIES))
+            )
+
+        if color_mode not in _COLOR_CONVERSIONS:
+            raise ValueError(
+                "The color mode should be one of {}".format(
+                    ", ".join(_COLOR_CONVERSIONS)
+                )
+            )
 
         # The maximum number of frames to buffer
         self.qmax_len = qmax_len
+        self.drop_policy = drop_policy
+        self.ring_buffer = ring_buffer
+        self.color_mode = color_mode
+
+        # the pool of frames, allocated when the first frame is read, the
+        # queue then contains the index of the frames in the pool
+        self._pool = None
+        self._free = queue.Queue()
+        self._raw = None
 
         # we'll store frames there
-        self.queue = queue.Queue()
+        self.queue = queue.Queue(maxsize=qmax_len)
         self.video_source = video
         self._start = start
 
@@ -50,15 +181,11 @@ class ThreadedVideoStream(object):
         if not self.capture:
             raise ValueError("Couldn" "t open the device.")
 
-        if self._start != 0:
-            # So CAP_PROP_POS_FRAMES seems to be broken,
-            # per https://github.com/opencv/opencv/issues/9053
-            self.pos_frames = self._start // 2  # set first frame to read
-            print(
-                "Warning: setting start frame seems buggy "
-                "(https://github.com/opencv/opencv/issues/9053). "
-                "A hack was used. Use at your own risk"
-            )
+        if self.color_mode == "raw":
+            self.capture.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+        if self._start != 0 and isinstance(self.video_source, str):
+            self._seek(self._start)
 
         if self._end is not None:
             self._end = self._end - self._start
@@ -66,6 +193,8 @@ class ThreadedVideoStream(object):
         """ Start the stream """
         self._stopped = False  # Use a flag to know the state of the process
         self._count = 0
+        self._dropped_oldest = 0
+        self._dropped_newest = 0
         self.thread = Thread(target=self._frame_read_loop, args=())
         self.thread.start()
 
@@ -81,6 +210,31 @@ class ThreadedVideoStream(object):
     def available(self):
         return self.is_streaming and self.queue.qsize() > 0
 
+    @property
+    def channel_order(self):
+        """ The order of the channels of the frames, "RGB", "BGR", "GRAY", or "RAW" """
+        return CHANNEL_ORDERS[self.color_mode]
+
+    @property
+    def frames_read(self):
+        """ The number of frames read from the video source """
+        return self._count
+
+    @property
+    def dropped_oldest(self):
+        """ The number of buffered frames discarded to make room for new ones """
+        return self._dropped_oldest
+
+    @property
+    def dropped_newest(self):
+        """ The number of new frames discarded because the buffer was full """
+        return self._dropped_newest
+
+    @property
+    def dropped_frames(self):
+        """ The total number of frames discarded """
+        return self._dropped_oldest + self._dropped_newest
+
     @property
     def width(self):
         return int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -126,17 +280,96 @@ class ThreadedVideoStream(object):
     def pos_frames(self):
         return self.capture.get(cv2.CAP_PROP_POS_FRAMES)
 
+    @property
+    def pos_msec(self):
+        return self.capture.get(cv2.CAP_PROP_POS_MSEC)
+
     @pos_frames.setter
     def pos_frames(self, value):
         self.capture.set(cv2.CAP_PROP_POS_FRAMES, value)
 
+    def _seek(self, frame):
+        """
+        Seek accurately to a frame of a video file
+
+        Setting CAP_PROP_POS_FRAMES does not land on the requested frame with
+        every codec (https://github.com/opencv/opencv/issues/9053). The
+        capture is set to the closest earlier position known to be accurate,
+        the position reached is verified with the time of the frame decoded
+        there (the frame index reported is affected by the same issue), and
+        the frames are decoded up to the requested one.
+        The accurate positions found are saved next to the video file
+        (`SEEK_CACHE_SUFFIX`) for the other processes and later sessions.
+        """
+        points = _get_seek_points(self.video_source)
+        n_points = len(points)
+        fps = self.fps
+
+        # the last frame to decode before streaming
+        target = frame - 1
+
+        if target < 0:
+            self.pos_frames = 0
+            return
+
+        # try the requested position first, then the accurate positions before
+        # it, and positions further and further away
+        candidates = set(points[: bisect.bisect_right(points, target)])
+        candidates.add(target)
+        step = 32
+        while target - step > 0:
+            candidates.add(target - step)
+            step *= 2
+
+        landed = None
+        for pos in sorted(candidates, reverse=True):
+            self.pos_frames = pos
+
+            if not self.capture.grab():
+                continue
+
+            if fps > 0:
+                # the index of the frame decoded, from its time
+                reported = int(np.floor(self.pos_msec * fps / 1000.0 + 0.5))
+            else:
+                reported = int(round(self.pos_frames)) - 1
+
+            if reported == pos:
+                if pos not in points:
+                    bisect.insort(points, pos)
+                landed = pos
+                break
+
+            elif 0 <= reported <= target:
+                # the capture landed on an earlier keyframe
+                if reported not in points:
+                    bisect.insort(points, reported)
+                landed = reported
+                break
+
+        if landed is None:
+            # decode from the beginning
+            self.pos_frames = 0
+            landed = -1
+
+        for i in range(target - landed):
+            if not self.capture.grab():
+                break
+
+        if len(points) > n_points:
+            _save_seek_points(self.video_source)
+
     def __del__(self):
-        self.stop()  # stop, just in case
+        if hasattr(self, "thread"):
+            self.stop()  # stop, just in case
 
     def stop(self):
         """ Stop the stream """
         self._stopped = True
-        self.thread.join()  # wait for frame reading loop to stop
+        # the reading thread can drop the last reference to the stream,
+        # the destructor is then called from the thread itself
+        if self.thread is not current_thread():
+            self.thread.join()  # wait for frame reading loop to stop
         with self.queue.mutex:
             self.queue.queue.clear()
 
@@ -144,7 +377,7 @@ class ThreadedVideoStream(object):
         if self.capture.isOpened():
             self.capture.release()
 
-    def read(self, n=1, block=True, timeout=1):
+    def read(self, n=1, block=True, timeout=1, timestamps=False):
         """
         Read some frames.
         Parameters
@@ -153,63 +386,532 @@ class ThreadedVideoStream(object):
             Number of frames to retrieve
         block: optional, bool
             Wether to do a blocking call or not
+        timestamps: optional, bool
+            If True, the timestamps of the frames are also returned, as an
+            array with the columns in `TIMESTAMP_FIELDS`
         """
 
         if self.queue.qsize() == 0 and self._stopped:
-            return None
+            return (None, None) if timestamps else None
 
         if n == 1:
-            while not self._stopped:
+            while True:
                 try:
-                    return self.queue.get(block=block, timeout=timeout)
+                    frame, stamp = self._get(block=block, timeout=timeout)
+                    return (frame, np.array(stamp)) if timestamps else frame
                 except queue.Empty:
-                    if self._stopped:
-                        return None
+                    if self._stopped or not block:
+                        return (None, None) if timestamps else None
 
         elif n > 1:
             ret = []
+            stamps = []
 
             while len(ret) < n:
                 try:
-                    ret.append(self.queue.get(block=block, timeout=timeout))
+                    frame, stamp = self._get(block=block, timeout=timeout)
+                    ret.append(frame)
+                    stamps.append(stamp)
                 except queue.Empty:
-                    if self._stopped:
-                        return ret
+                    if self._stopped or not block:
+                        break
 
-            return ret
+            if timestamps:
+                return ret, np.array(stamps).reshape((-1, len(TIMESTAMP_FIELDS)))
+            else:
+                return ret
 
         else:
             raise ValueError("n must be strictly positive")
 
+    def read_batch(self, n, timeout=1, out=None, timestamps=False):
+        """
+        Read a batch of frames stacked in an array
+
+        Parameters
+        ----------
+        n: int
+            The maximum number of frames to retrieve
+        timeout: float, optional
+            The maximum time to wait for the frames, in seconds
+        out: numpy.ndarray (n, height, width[, n_colors]), optional
+            An array where to store the frames, if not provided, a new
+            array is allocated
+        timestamps: bool, optional
+            If True, the timestamps of the frames are also returned
+
+        Returns
+        -------
+        frames: numpy.ndarray (n_frames, height, width[, n_colors])
+            The frames (a view in `out`), fewer than `n` if the stream stopped
+            or the timeout expired, or None if no frame could be read
+        timestamps: numpy.ndarray (n_frames, 3)
+            The timestamps of the frames, with the columns in `TIMESTAMP_FIELDS`,
+            only if `timestamps` is True
+        """
+        if n < 1:
+            raise ValueError("n must be strictly positive")
+
+        if out is not None and out.shape[0] < n:
+            raise ValueError("The output array is too small for the batch")
+
+        deadline = time.perf_counter() + timeout
+        count = 0
+        stamps = np.empty((n, len(TIMESTAMP_FIELDS)))
+
+        while count < n:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+
+            try:
+                frame, stamp = self._get(block=True, timeout=min(remaining, 0.1))
+            except queue.Empty:
+                if self._stopped and self.queue.qsize() == 0:
+                    break
+                continue
+
+            if out is None:
+                out = np.empty((n,) + frame.shape, dtype=frame.dtype)
+
+            out[count] = frame
+            stamps[count] = stamp
+            count += 1
+
+            # the frame was copied, give it back to the pool
+            self.release(frame)
+
+        if count == 0:
+            return (None, None) if timestamps else None
+
+        if timestamps:
+            return out[:count], stamps[:count]
+        else:
+            return out[:count]
+
+    def release(self, frames):
+        """
+        Give back frames to the pool in ring buffer mode
+
+        Parameters
+        ----------
+        frames: numpy.ndarray or list of numpy.ndarray
+            The frames returned by `read`
+        """
+        if not self.ring_buffer:
+            return
+
+        if not isinstance(frames, list):
+            frames = [frames]
+
+        base = self._pool.__array_interface__["data"][0]
+        for frame in frames:
+            offset = frame.__array_interface__["data"][0] - base
+            slot = offset // self._pool.strides[0]
+            if offset < 0 or slot >= self._pool.shape[0]:
+                raise ValueError("The frame does not belong to the pool of this stream")
+            self._free.put(slot)
+
+    def _get(self, block=True, timeout=None):
+        """ Get the next frame and its timestamp from the buffer """
+        item, stamp = self.queue.get(block=block, timeout=timeout)
+        if self.ring_buffer:
+            return self._pool[item], stamp
+        else:
+            return item, stamp
+
     def _frame_read_loop(self):
         """ This method will fetch the frames in a concurrent thread """
 
         while not self._stopped:
 
-            if self.queue.qsize() >= self.qmax_len:
-                continue
+            if self.ring_buffer:
+                # decode in the same frame every time
+                ret, self._raw = self.capture.read(self._raw)
+            else:
+                ret, frame = self.capture.read()
 
-            ret, frame = self.capture.read()
+            if not ret:
+                break
+
+            stamp = (
+                time.monotonic(),
+                self.capture.get(cv2.CAP_PROP_POS_MSEC),
+                self.capture.get(cv2.CAP_PROP_POS_FRAMES) - 1,
+            )
 
             self._count += 1
 
-            if not ret:
-                break
+            if self.ring_buffer:
+                self._put_ring(self._raw, stamp)
             else:
-                # Return RGB frame
-                self.queue.put(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                if self._end is not None and self._count >= self._end:
-                    break
+                self._put((self._convert(frame), stamp))
+
+            if self._end is not None and self._count >= self._end:
+                break
 
         self._stopped = True
 
+    def _put(self, item):
+        """ Add a frame, and its timestamp, to the buffer according to the drop policy """
+
+        if self.drop_policy == "block":
+            # wait for the consumer, but check regularly if we were stopped
+            while not self._stopped:
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        elif self.drop_policy == "drop_newest":
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                self._dropped_newest += 1
+
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self._dropped_oldest += 1
+                    except queue.Empty:
+                        pass
+
+    def _convert(self, frame, dst=None):
+        """ Convert a frame to the color mode of the stream """
+        code = _COLOR_CONVERSIONS[self.color_mode]
+
+        if code is None:
+            if dst is None:
+                return frame
+            np.copyto(dst, frame)
+            return dst
+
+        return cv2.cvtColor(frame, code, dst=dst)
+
+    def _put_ring(self, frame, stamp):
+        """ Convert a frame into a free frame of the pool """
+
+        if self._pool is None:
+            first = self._convert(frame)
+            self._pool = np.empty((self.qmax_len,) + first.shape, dtype=first.dtype)
+            for slot in range(self.qmax_len):
+                self._free.put(slot)
+
+        slot = None
+
+        if self.drop_policy == "block":
+            while not self._stopped:
+                try:
+                    slot = self._free.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    pass
+
+        else:
+            try:
+                slot = self._free.get_nowait()
+            except queue.Empty:
+                if self.drop_policy == "drop_oldest":
+                    # reuse the oldest frame not yet read
+                    try:
+                        slot, _ = self.queue.get_nowait()
+                        self._dropped_oldest += 1
+                    except queue.Empty:
+                        pass
+
+        if slot is None:
+            if not self._stopped:
+                self._dropped_newest += 1
+            return
+
+        self._convert(frame, dst=self._pool[slot])
+        self.queue.put_nowait((slot, stamp))
+
     def __enter__(self):
-        pass
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class MultiCameraStream(object):
+    """
+    Capture several videos (live streams or files) in synchronized bundles
+    of frames
+
+    Every video is read by its own `ThreadedVideoStream`. The frames are
+    aligned using their timestamps: the oldest frames are discarded until
+    the frames of all the videos are within `tolerance` of each other.
+
+    Parameters
+    ----------
+    sources: list of int or str
+        The index of the video streams or the filenames
+    tolerance: float, optional
+        The maximum difference between the times of the frames of a bundle,
+        in seconds (default to half the shortest frame period)
+    clock: str, optional
+        The time used to align the frames, "host" (the shared monotonic
+        clock of the computer, when the frames are read) or "decoder"
+        (the time of the frames in the videos, from the first frame read in
+        every video). Default to "decoder" for files and "host" for live
+        streams.
+    starts: list of int, optional
+        The first frame to read in every video. With the "decoder" clock, the
+        first frames read are aligned, which offsets the videos against each
+        other.
+    **kwargs:
+        Extra arguments of `ThreadedVideoStream`
+    """
+
+    def __init__(self, sources, tolerance=None, clock=None, starts=None, **kwargs):
+
+        if clock is None:
+            clock = "decoder" if all([isinstance(s, str) for s in sources]) else "host"
+
+        if clock not in ["host", "decoder"]:
+            raise ValueError("The clock should be host or decoder")
+
+        if starts is None:
+            starts = [0] * len(sources)
+
+        self.sources = sources
+        self.clock = clock
+        self.streams = [
+            ThreadedVideoStream(source, start=start, **kwargs)
+            for source, start in zip(sources, starts)
+        ]
+
+        if tolerance is None:
+            rates = [s.fps for s in self.streams if s.fps > 0]
+            tolerance = 0.5 / max(rates) if len(rates) > 0 else 0.02
+        self.tolerance = tolerance
+
+        # the oldest frame read from every stream, not yet in a bundle
+        self._heads = [None] * len(self.streams)
+        self._unsynced = [0] * len(self.streams)
+
+        # the time of the first frame of every video, for the decoder clock
+        self._origins = [None] * len(self.streams)
+
+    def __len__(self):
+        return len(self.streams)
+
+    @property
+    def is_streaming(self):
+        """ Returns True while all the streams can provide frames """
+        return all(
+            [
+                s.is_streaming or len(s) > 0 or head is not None
+                for s, head in zip(self.streams, self._heads)
+            ]
+        )
+
+    @property
+    def fps(self):
+        return min([s.fps for s in self.streams])
+
+    @property
+    def channel_order(self):
+        return self.streams[0].channel_order
+
+    @property
+    def unsynced_frames(self):
+        """ The number of frames of every stream discarded to align the frames """
+        return list(self._unsynced)
+
+    @property
+    def dropped_frames(self):
+        """ The number of frames of every stream lost, by the buffers or the alignment """
+        return [s.dropped_frames + u for s, u in zip(self.streams, self._unsynced)]
+
+    def _time(self, i, stamp):
+        """ The time of a frame of the `i`-th video used for the alignment """
+        if self.clock == "host":
+            return stamp[0]
+
+        if self._origins[i] is None:
+            self._origins[i] = stamp[1] / 1000.0
+        return stamp[1] / 1000.0 - self._origins[i]
+
+    def read(self, timeout=1, timestamps=False):
+        """
+        Read a bundle of synchronized frames
+
+        Parameters
+        ----------
+        timeout: float, optional
+            The maximum time to wait for a bundle, in seconds
+        timestamps: bool, optional
+            If True, the timestamps of the frames are also returned
+
+        Returns
+        -------
+        frames: list of numpy.ndarray
+            One frame per video, or None if no bundle could be formed before
+            the timeout or at the end of a video, the streaming is over when
+            `is_streaming` is also False
+        timestamps: numpy.ndarray (n_videos, 3)
+            The timestamps of the frames, only if `timestamps` is True
+        """
+        deadline = time.perf_counter() + timeout
+
+        while True:
+            for i, stream in enumerate(self.streams):
+                while self._heads[i] is None:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0 or not (stream.is_streaming or len(stream) > 0):
+                        return (None, None) if timestamps else None
+
+                    try:
+                        self._heads[i] = stream._get(timeout=min(remaining, 0.1))
+                    except queue.Empty:
+                        pass
+
+            times = [self._time(i, stamp) for i, (_, stamp) in enumerate(self._heads)]
+            latest = max(times)
+            late = [i for i, t in enumerate(times) if t < latest - self.tolerance]
+
+            if len(late) == 0:
+                frames = [frame for frame, _ in self._heads]
+                stamps = np.array([stamp for _, stamp in self._heads])
+                self._heads = [None] * len(self.streams)
+                return (frames, stamps) if timestamps else frames
+
+            # the frames too old to be matched are discarded
+            for i in late:
+                self.streams[i].release(self._heads[i][0])
+                self._heads[i] = None
+                self._unsynced[i] += 1
+
+    def release(self, frames):
+        """ Give back the frames of a bundle to the streams in ring buffer mode """
+        for stream, frame in zip(self.streams, frames):
+            stream.release(frame)
+
+    def stop(self):
+        """ Stop all the streams """
+        for stream in self.streams:
+            stream.stop()
+
+    def __enter__(self):
+        return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.stop()
 
 
+def _frame_clock(timestamps):
+    """
+    The time of the frames in seconds, from the decoder if it reports
+    timestamps, otherwise from the host
+    """
+    timestamps = np.asarray(timestamps)
+    pos_msec = timestamps[:, 1]
+
+    if len(pos_msec) > 1 and np.any(np.diff(pos_msec) > 0):
+        return pos_msec / 1000.0
+    else:
+        return timestamps[:, 0]
+
+
+def estimate_fps(timestamps):
+    """
+    Estimate the framerate from the timestamps of the frames, robustly to
+    dropped frames
+
+    Parameters
+    ----------
+    timestamps: array_like (n_frames[, n_cameras], 3)
+        The timestamps, with the columns in `TIMESTAMP_FIELDS`, e.g., from
+        `MultiCameraStream` when there is a camera axis
+
+    Returns
+    -------
+    float
+        The framerate, or None if there are not enough frames, a list with
+        the framerate of every camera if there is a camera axis
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.ndim == 3:
+        return [estimate_fps(timestamps[:, c]) for c in range(timestamps.shape[1])]
+
+    clock = _frame_clock(timestamps)
+    steps = np.diff(clock)
+    steps = steps[steps > 0]
+
+    if len(steps) == 0:
+        return None
+
+    return 1.0 / np.median(steps)
+
+
+def detect_drops(timestamps, fps=None):
+    """
+    Find the frames that were dropped or duplicated during a capture
+
+    The frame index reported by the decoder is used when it is available,
+    otherwise the gaps in the time of the frames are compared to the
+    frame period.
+
+    Parameters
+    ----------
+    timestamps: array_like (n_frames[, n_cameras], 3)
+        The timestamps, with the columns in `TIMESTAMP_FIELDS`, e.g., from
+        `MultiCameraStream` when there is a camera axis
+    fps: float or list of float, optional
+        The framerate (of every camera), estimated from the timestamps if
+        not provided
+
+    Returns
+    -------
+    dict
+        With keys `dropped`, the index of the frames followed by missing
+        frames, `n_missing`, the number of frames missing after them, and
+        `duplicates`, the index of the frames that repeat the previous frame,
+        a list with the dict of every camera if there is a camera axis
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.ndim == 3:
+        n_cameras = timestamps.shape[1]
+        if fps is None or np.ndim(fps) == 0:
+            fps = [fps] * n_cameras
+        return [detect_drops(timestamps[:, c], fps=fps[c]) for c in range(n_cameras)]
+
+    frame_index = timestamps[:, 2]
+
+    decoder_index = (
+        len(frame_index) > 1
+        and np.all(frame_index >= 0)
+        and np.any(np.diff(frame_index) > 0)
+    )
+
+    if decoder_index:
+        steps = np.diff(frame_index)
+    else:
+        if fps is None:
+            fps = estimate_fps(timestamps)
+        if fps is None:
+            steps = np.ones(max(len(frame_index) - 1, 0))
+        else:
+            steps = np.rint(np.diff(_frame_clock(timestamps)) * fps)
+
+    steps = steps.astype(np.int64)
+    dropped = np.nonzero(steps > 1)[0]
+
+    return {
+        "dropped": dropped,
+        "n_missing": steps[dropped] - 1,
+        "duplicates": np.nonzero(steps <= 0)[0] + 1,
+    }
+
+
 def video_stream(video, start=0, end=None, callback=None, show=False):
     """
     Streams a video for display or processing
@@ -231,11 +933,13 @@ def video_stream(video, start=0, end=None, callback=None, show=False):
     if show:
         cv2.namedWindow("image", cv2.WINDOW_AUTOSIZE)
 
-    with ThreadedVideoStream(video, start=start, end=end) as cap:
+    # frames in the native order of opencv for display
+    with ThreadedVideoStream(video, start=start, end=end, color_mode="bgr") as cap:
 
-        fps = cap.get_fps()
+        fps = cap.fps
 
-        while cap.is_streaming:
+        # the remaining frames are read even if the capture stopped
+        while True:
 
             frame = cap.read()
             if frame is None:
@@ -274,7 +978,6 @@ def frame_grabber(video, frame=0, show=False):
 
     if show:
         import matplotlib.pyplot as plt
-        import numpy as np
 
         plt.imshow(np.array(grabber.extract()))
         plt.show()
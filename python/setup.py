@@ -20,7 +20,11 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/onolab-tmu/blinky",
     install_requires=["numpy", "matplotlib", "msgpack", "opencv-python", "pillow"],
+    extras_require={"hdf5": ["h5py"]},
     packages=setuptools.find_packages(),
+    entry_points={
+        "console_scripts": ["blinky-index=blinkytools.index:index_main"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
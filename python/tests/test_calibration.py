@@ -0,0 +1,109 @@
+import numpy as np
+
+from blinkytools import BlinkyFile
+from blinkytools.calibration import Calibration, calibrate, fit_ramp, ramp_phase
+from blinkytools.non_linearity import blinky_lut, blinky_non_linearity
+
+
+def make_calibration(locations):
+    """ Devices with different look-up tables and pixel ranges """
+    grid = np.linspace(0.0, 1.0, len(blinky_lut))
+    luts = [blinky_lut, grid, grid ** 0.5]
+
+    devices = {}
+    for i, loc in enumerate(locations):
+        devices[loc] = {"lut": luts[i % len(luts)], "lo": 10.0 * i, "hi": 200.0 + i}
+    return Calibration(devices=devices)
+
+
+def test_apply_several_devices():
+    locations = [(10, 20), (30, 40), (50, 60)]
+    calib = make_calibration(locations)
+
+    rng = np.random.RandomState(0)
+    power = 10 ** rng.uniform(-7.5, -1.5, size=(100, len(locations)))
+
+    # the pixel values recorded by the camera
+    signals = np.zeros_like(power)
+    for i, loc in enumerate(locations):
+        y = blinky_non_linearity(power[:, i], lut=calib.lut(loc))
+        signals[:, i] = calib[loc]["lo"] + y * (calib[loc]["hi"] - calib[loc]["lo"])
+
+    out = calib.apply(signals, locations)
+
+    assert out.shape == signals.shape
+    np.testing.assert_allclose(out, power, rtol=1e-6)
+
+
+def test_dump_load(tmp_path):
+    locations = [(1, 2), (3, 4)]
+    calib = make_calibration(locations)
+
+    filename = str(tmp_path / "calibration.msgpack")
+    calib.dump(filename)
+    loaded = Calibration.load(filename)
+
+    assert loaded.locations == locations
+    for loc in locations:
+        np.testing.assert_array_equal(loaded.lut(loc), calib.lut(loc))
+
+
+def make_ramps(n_pixels=4, period=90, n_periods=8):
+    """ The ramps of the firmware, alternating white and red, with noise """
+    rng = np.random.RandomState(1)
+    grid = np.linspace(0.0, 1.0, len(blinky_lut))
+    white = lambda p: np.interp(p, grid, blinky_lut)
+    red = lambda p: p ** 2
+
+    starts = rng.uniform(0, period, size=n_pixels)
+    frames = np.arange(period * n_periods)[:, None]
+    cycles = (frames - starts[None, :]) / period
+    phase = cycles - np.floor(cycles)
+    is_white = np.mod(np.floor(cycles), 2) == 0
+
+    signals = np.where(is_white, 20 + 200 * white(phase), 20 + 80 * red(phase))
+    signals += rng.normal(scale=0.5, size=signals.shape)
+
+    return signals, phase, white(grid), red(grid)
+
+
+def test_ramp_phase():
+    signals, phase, _, _ = make_ramps()
+    est_phase, index, valid, period = ramp_phase(signals)
+
+    assert abs(period - 90) <= 1
+    # the first complete ramp is the period 0
+    assert np.all(index[0] <= 0) and np.all(np.min(index, axis=0) >= -1)
+
+    error = np.abs(est_phase - phase)[valid]
+    error = np.minimum(error, 1.0 - error)
+    assert np.max(error) < 1.0 / 90
+
+
+def test_fit_ramp_colors():
+    signals, _, white, red = make_ramps()
+
+    luts, lo, hi = fit_ramp(signals, period=90)
+    assert np.max(np.abs(luts - white[None, :])) < 0.02
+    np.testing.assert_allclose(lo, 20, atol=2)
+    np.testing.assert_allclose(hi, 220, atol=2)
+
+    luts, lo, hi = fit_ramp(signals, period=90, color="red")
+    assert np.max(np.abs(luts - red[None, :])) < 0.02
+
+    # every other period is white
+    luts, _, _ = fit_ramp(signals, period=90, periods=[0, 2, 4])
+    assert np.max(np.abs(luts - white[None, :])) < 0.02
+
+
+def test_calibrate(tmp_path):
+    signals, _, white, _ = make_ramps()
+    locations = [(10 * i, 5) for i in range(signals.shape[1])]
+    bfile = BlinkyFile(locations, signals[:, :, None, None].astype(np.float32), 30)
+
+    cache = str(tmp_path / "calibration.msgpack")
+    calib = calibrate(bfile, cache=cache)
+
+    assert Calibration.load(cache).locations == locations
+    for loc in locations:
+        assert np.max(np.abs(calib.lut(loc) - white)) < 0.02
@@ -0,0 +1,47 @@
+import os
+
+import numpy as np
+
+from blinkytools.index import connect, update
+from blinkytools.io import BlinkyFile
+
+
+def make_files(root, n_files=3):
+    for i in range(n_files):
+        data = np.full((20, 2), i, dtype=np.float32)
+        BlinkyFile([(1, 2), (3, 4)], data, 30.0).dump(
+            os.path.join(root, "rec_{}.blinky".format(i))
+        )
+
+
+def test_update_stats_later(tmp_path):
+    make_files(str(tmp_path))
+    db = connect(str(tmp_path / "index.db"))
+
+    assert update(db, str(tmp_path), n_workers=1) == (3, 0)
+    assert update(db, str(tmp_path), n_workers=1) == (0, 0)
+
+    # the statistics are computed for the files already in the catalog
+    assert update(db, str(tmp_path), stats=True, n_workers=1) == (3, 0)
+    means = [m for (m,) in db.execute("SELECT mean FROM locations ORDER BY path")]
+    assert means == [0.0, 0.0, 1.0, 1.0, 2.0, 2.0]
+
+    assert update(db, str(tmp_path), stats=True, n_workers=1) == (0, 0)
+    assert update(db, str(tmp_path), n_workers=1) == (0, 0)
+
+
+def test_unreadable_files(tmp_path):
+    make_files(str(tmp_path), n_files=1)
+    broken = tmp_path / "broken.blinky"
+    broken.write_bytes(b"not a blinky file")
+    db = connect(str(tmp_path / "index.db"))
+
+    assert update(db, str(tmp_path), n_workers=1) == (1, 0)
+    assert db.execute("SELECT COUNT(*) FROM unreadable").fetchone()[0] == 1
+
+    # the broken file is not read again until it is modified
+    assert update(db, str(tmp_path), n_workers=1) == (0, 0)
+
+    os.remove(str(broken))
+    assert update(db, str(tmp_path), n_workers=1) == (0, 0)
+    assert db.execute("SELECT COUNT(*) FROM unreadable").fetchone()[0] == 0
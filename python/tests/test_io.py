@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from blinkytools.io import BlinkyFile, BlinkyFileWriter, reduce_boxes
+
+LOCATIONS = [(1, 2), (3, 4), (5, 6)]
+
+
+@pytest.mark.parametrize(
+    "shape", [(50, 3), (50, 3, 3), (50, 3, 5, 5), (50, 3, 5, 5, 3)]
+)
+def test_reduce_boxes(shape):
+    """ The boxes and colors are averaged, one signal per Blinky remains """
+    data = np.random.RandomState(0).uniform(size=shape)
+    signals = reduce_boxes(data)
+
+    assert signals.shape == (50, 3)
+    np.testing.assert_allclose(
+        signals[:, 1], data[:, 1].reshape((50, -1)).mean(axis=1), rtol=1e-5
+    )
+
+
+@pytest.mark.parametrize("codec", [None, "zlib"])
+@pytest.mark.parametrize("chunk_size", [None, 16])
+def test_dump_chunked_mmap(tmp_path, codec, chunk_size):
+    """ A lazily read file can be written back in both formats """
+    data = np.random.RandomState(0).randint(0, 256, size=(50, 3, 3, 3), dtype=np.uint8)
+    original = BlinkyFile(LOCATIONS, data, 30.0)
+
+    filename = str(tmp_path / "chunked.blinky")
+    original.dump(filename, chunk_size=10, codec=codec)
+
+    content = BlinkyFile.load(filename, mmap=True)
+    assert content.data.astype(np.float32).dtype == np.float32
+
+    copy = str(tmp_path / "copy.blinky")
+    content.dump(copy, chunk_size=chunk_size)
+
+    np.testing.assert_array_equal(BlinkyFile.load(copy).data, data)
+
+
+def test_dump_empty(tmp_path):
+    data = np.zeros((0, 3, 2), dtype=np.float32)
+    filename = str(tmp_path / "empty.blinky")
+    BlinkyFile(LOCATIONS, data, 30.0).dump(filename, chunk_size=8)
+
+    content = BlinkyFile.load(filename)
+    assert content.data.shape == data.shape
+    assert content.data.dtype == data.dtype
+
+
+def test_truncated_file_with_timestamps(tmp_path):
+    """ The complete chunks of an interrupted recording can be read """
+    data = np.arange(13 * 3, dtype=np.float32).reshape((13, 3))
+    stamps = np.arange(13 * 3, dtype=np.float64).reshape((13, 3))
+
+    filename = str(tmp_path / "interrupted.blinky")
+    writer = BlinkyFileWriter(filename, LOCATIONS, 30.0, chunk_size=6)
+    writer.write(data, timestamps=stamps)
+    writer.flush()
+    size = writer._file.tell()
+    header_size = writer._index[0][0]
+    writer._file.close()
+
+    with open(filename, "rb") as f:
+        content = f.read()
+
+    truncated = str(tmp_path / "truncated.blinky")
+    for end in range(header_size, size + 1):
+        with open(truncated, "wb") as f:
+            f.write(content[:end])
+
+        bfile = BlinkyFile.load(truncated)
+        n = len(bfile.data)
+        assert n in [0, 6, 12, 13]
+        np.testing.assert_array_equal(bfile.data, data[:n])
+        if n > 0:
+            np.testing.assert_array_equal(bfile.timestamps, stamps[:n])
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_load_range_reads_timestamps_of_range(tmp_path, mmap):
+    """ Only the timestamps of the chunks in the range are read """
+    from blinkytools.io import _read_layout
+
+    data = np.arange(13 * 3, dtype=np.float32).reshape((13, 3))
+    stamps = np.arange(13 * 3, dtype=np.float64).reshape((13, 3))
+
+    filename = str(tmp_path / "stamps.blinky")
+    with BlinkyFileWriter(filename, LOCATIONS, 30.0, chunk_size=6) as writer:
+        writer.write(data, timestamps=stamps)
+
+    # overwrite the timestamps of the first chunk
+    desc = _read_layout(filename)[1][0]["timestamps"]["data"]
+    with open(filename, "r+b") as f:
+        f.seek(desc["offset"])
+        f.write(b"\xff" * desc["nbytes"])
+
+    for start, stop in [(7, 11), (6, None), (-2, None), (10, 8)]:
+        content = BlinkyFile.load(filename, mmap=mmap, start=start, stop=stop)
+        np.testing.assert_array_equal(content.timestamps, stamps[start:stop])
+        assert content.timestamps.shape[0] == content.data.shape[0]
+
+    content = BlinkyFile.load(filename, start=5, stop=8)
+    assert np.all(np.isnan(content.timestamps[0]))
+    np.testing.assert_array_equal(content.timestamps[1:], stamps[6:8])
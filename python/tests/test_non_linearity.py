@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from blinkytools import non_linearity
+from blinkytools.non_linearity import (
+    blinky_lut,
+    blinky_non_linearity,
+    blinky_non_linearity_dense,
+    blinky_non_linearity_inv,
+    blinky_non_linearity_inv_dense,
+)
+
+# a look-up table different from the default, e.g., from a calibration
+DEVICE_LUT = np.linspace(0.0, 1.0, len(blinky_lut)) ** 1.5
+
+
+@pytest.mark.parametrize("lut", [None, DEVICE_LUT])
+@pytest.mark.parametrize("dtype", [np.float32, np.float64])
+def test_dense_forward(lut, dtype):
+    power = 10 ** np.random.RandomState(0).uniform(-10, 0, size=50000)
+    ref = blinky_non_linearity(power, lut=lut)
+
+    out = np.empty(power.shape, dtype=dtype)
+    ret = blinky_non_linearity_dense(power, out=out, lut=lut, block_size=1000)
+
+    assert ret is out
+    np.testing.assert_allclose(out, ref, rtol=0, atol=3e-4)
+    np.testing.assert_allclose(
+        blinky_non_linearity_dense(power, lut=lut), ref, rtol=0, atol=3e-4
+    )
+
+
+@pytest.mark.parametrize("lut", [None, DEVICE_LUT])
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+def test_dense_inverse(lut, dtype):
+    max_value = np.iinfo(dtype).max
+    pixels = np.random.RandomState(0).randint(0, max_value + 1, size=(100, 30))
+    pixels = pixels.astype(dtype)
+    ref = blinky_non_linearity_inv(pixels / max_value, lut=lut)
+
+    out = np.empty(pixels.shape)
+    ret = blinky_non_linearity_inv_dense(pixels, out=out, lut=lut, block_size=1000)
+
+    assert ret is out
+    np.testing.assert_allclose(out, ref, rtol=1e-12, atol=0)
+    np.testing.assert_allclose(
+        blinky_non_linearity_inv_dense(pixels, lut=lut), ref, rtol=1e-12, atol=0
+    )
+
+
+def test_dense_table_built_once_per_lut():
+    pixels = np.arange(256, dtype=np.uint8)
+    luts = [blinky_lut, DEVICE_LUT, DEVICE_LUT ** 2]
+
+    outputs = [blinky_non_linearity_inv_dense(pixels, lut=lut) for lut in luts]
+    n_tables = len(non_linearity._dense_tables)
+
+    for lut, ref in zip(luts, outputs):
+        out = blinky_non_linearity_inv_dense(pixels, lut=lut)
+        np.testing.assert_array_equal(out, ref)
+
+    assert len(non_linearity._dense_tables) == n_tables
+    assert not np.allclose(outputs[0], outputs[1])
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from blinkytools.io import BlinkyFile, BlinkyFileWriter
+from blinkytools.processors import (
+    RECENT_TIMESTAMPS,
+    BoxCatcher,
+    MultiBoxCatcher,
+    OnlineStats,
+)
+
+
+@pytest.mark.parametrize("shape", [(3,), (4, 5)])
+def test_online_stats(shape):
+    data = np.random.RandomState(0).uniform(size=(1000,) + shape)
+
+    stats = OnlineStats(shape)
+    for start, end in [(0, 1), (1, 10), (10, 10), (10, 1000)]:
+        stats.__process__(data[start:end])
+    stats.stop()
+
+    assert stats.count == 1000
+    np.testing.assert_allclose(stats.mean, data.mean(axis=0))
+    np.testing.assert_allclose(stats.var, data.var(axis=0, ddof=1))
+    np.testing.assert_array_equal(stats.min, data.min(axis=0))
+    np.testing.assert_array_equal(stats.max, data.max(axis=0))
+
+
+def test_multi_box_catcher_cameras(tmp_path):
+    pixels = [[(5, 5), (10, 8)], [(3, 4)]]
+    locations = MultiBoxCatcher.flatten(pixels)[0]
+
+    filename = str(tmp_path / "multi.blinky")
+    writer = BlinkyFileWriter(filename, locations, 30.0)
+    catcher = MultiBoxCatcher(pixels, (3, 3), writer=writer, reduce="mean")
+
+    frames = [np.full((4, 16, 16, 3), c + 1, dtype=np.uint8) for c in range(2)]
+    catcher.__process_batch__(frames)
+    catcher.stop()
+    writer.close()
+
+    content = BlinkyFile.load(filename)
+    assert content.metadata["cameras"] == [0, 0, 1]
+    np.testing.assert_array_equal(content.data[:, :, 0], [[1, 1, 2]] * 4)
+
+
+def test_box_catcher_timestamps_with_writer(tmp_path):
+    """ The timestamps go to the file, only the recent ones stay in memory """
+    filename = str(tmp_path / "stamps.blinky")
+    writer = BlinkyFileWriter(filename, [(2, 2)], 30.0)
+    catcher = BoxCatcher([(2, 2)], (3, 3), writer=writer)
+
+    n_frames = RECENT_TIMESTAMPS + 500
+    frames = np.zeros((n_frames, 8, 8, 3), dtype=np.uint8)
+    stamps = np.tile(np.arange(n_frames, dtype=np.float64)[:, None], (1, 3))
+    for start in range(0, n_frames, 100):
+        end = start + 100
+        catcher.__process_batch__(frames[start:end], stamps[start:end])
+
+    assert catcher.timestamps == []
+    assert len(catcher.recent_timestamps) == RECENT_TIMESTAMPS
+
+    catcher.stop()
+    writer.close()
+
+    assert catcher.timestamps is None
+    np.testing.assert_array_equal(BlinkyFile.load(filename).timestamps, stamps)
+
+
+def test_box_catcher_releases_ring_buffer(tmp_path):
+    from blinkytools.video import ThreadedVideoStream
+    import cv2
+
+    filename = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+
+    # the pool is smaller than the video, the frames must be given back
+    with ThreadedVideoStream(
+        filename, qmax_len=3, ring_buffer=True, color_mode="gray"
+    ) as stream:
+        catcher = BoxCatcher([(10, 10)], (3, 3), reduce="mean", release=stream.release)
+        n_read = 0
+        while True:
+            frame = stream.read(timeout=1)
+            if frame is None:
+                break
+            catcher.process(frame)
+            n_read += 1
+        catcher.stop()
+
+        # the frames not processed before the stop are also given back
+        assert stream._free.qsize() == 3
+
+    assert n_read == 20
+    values = np.array(catcher.data).ravel()
+    np.testing.assert_allclose(values, 10 * np.arange(len(values)), atol=2)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from blinkytools.video import detect_drops, estimate_fps
+
+
+def make_timestamps(frame_index, fps=30.0):
+    frame_index = np.asarray(frame_index, dtype=np.float64)
+    time = frame_index / fps
+    return np.stack([time, 1000.0 * time, frame_index], axis=-1)
+
+
+def test_detect_drops():
+    stamps = make_timestamps([0, 1, 2, 5, 6, 6, 7])
+    drops = detect_drops(stamps)
+
+    np.testing.assert_array_equal(drops["dropped"], [2])
+    np.testing.assert_array_equal(drops["n_missing"], [2])
+    np.testing.assert_array_equal(drops["duplicates"], [5])
+    assert abs(estimate_fps(stamps) - 30.0) < 1e-6
+
+
+def test_camera_axis():
+    """ The timestamps of several cameras, e.g., from MultiCameraStream """
+    stamps = np.stack(
+        [make_timestamps([0, 1, 2, 3, 4]), make_timestamps([0, 1, 3, 4, 5], fps=25.0)],
+        axis=1,
+    )
+
+    fps = estimate_fps(stamps)
+    np.testing.assert_allclose(fps, [30.0, 25.0])
+
+    drops = detect_drops(stamps)
+    assert len(drops) == 2
+    assert len(drops[0]["dropped"]) == 0
+    np.testing.assert_array_equal(drops[1]["dropped"], [1])
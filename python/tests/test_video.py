@@ -0,0 +1,84 @@
+import gc
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from blinkytools.video import ThreadedVideoStream
+
+
+@pytest.fixture
+def video(tmp_path):
+    """ A short video where every frame has the value of its index """
+    filename = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(filename, cv2.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for i in range(20):
+        writer.write(np.full((48, 64, 3), 10 * i, dtype=np.uint8))
+    writer.release()
+    return filename
+
+
+def test_stream_stopped_when_collected(video):
+    stream = ThreadedVideoStream(video)
+    thread = stream.thread
+
+    del stream
+    gc.collect()
+
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_read_from_start(video):
+    with ThreadedVideoStream(video, start=5, color_mode="gray") as stream:
+        frame = stream.read()
+
+    assert abs(int(frame.mean()) - 50) <= 2
+
+
+def test_seek_points_saved(video):
+    from blinkytools import video as video_module
+
+    with ThreadedVideoStream(video, start=15, color_mode="gray") as stream:
+        frame = stream.read()
+    assert abs(int(frame.mean()) - 150) <= 2
+
+    # the positions are found again by another process
+    video_module._seek_points.clear()
+    assert os.path.exists(video + video_module.SEEK_CACHE_SUFFIX)
+    points = video_module._get_seek_points(video)
+    assert len(points) > 1 and points[0] == 0
+
+
+def test_multi_camera_starts_and_end(video):
+    from blinkytools.video import MultiCameraStream
+
+    bundles = []
+    with MultiCameraStream([video, video], starts=[0, 3], color_mode="gray") as stream:
+        while True:
+            frames = stream.read(timeout=5)
+            if frames is not None:
+                bundles.append([int(round(f.mean())) for f in frames])
+            elif not stream.is_streaming:
+                break
+
+    # the second video is offset by three frames until its end
+    assert len(bundles) == 17
+    for i, (first, second) in enumerate(bundles):
+        assert abs(first - 10 * i) <= 2
+        assert abs(second - 10 * (i + 3)) <= 2
+
+
+def test_seek_ignores_frame_index(video, monkeypatch):
+    # the frame index reported by some codecs is wrong after seeking
+    wrong = property(
+        lambda self: self.capture.get(cv2.CAP_PROP_POS_FRAMES) + 3,
+        ThreadedVideoStream.pos_frames.fset,
+    )
+    monkeypatch.setattr(ThreadedVideoStream, "pos_frames", wrong)
+
+    with ThreadedVideoStream(video, start=12, color_mode="gray") as stream:
+        frame = stream.read()
+
+    assert abs(int(frame.mean()) - 120) <= 2